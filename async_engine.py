@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Moteur de charge asyncio pour TinyInsta (alternative à Locust).
+
+Rejoue le comportement de `TinyInstaUser.get_timeline` (un user_id fixe par
+user virtuel tiré selon sa popularité, pause entre WAIT_MIN et WAIT_MAX) avec des coroutines et un
+client aiohttp à connexions keep-alive : quelques milliers de users virtuels
+tiennent dans un seul processus. Utilise uvloop s'il est installé.
+
+Les users démarrent régulièrement sur RAMP_FRACTION de la durée du run (débit
+de démarrage proportionnel au nb de users), puis la mesure dure `duration`
+s : comme avec Locust (cf. benchmark.RunPhases), les requêtes de la montée en
+charge ne comptent pas dans les métriques, seulement dans la série par seconde.
+Celles qui se terminent après la fin de la mesure non plus : le débit est
+calculé sur exactement `duration` s.
+
+Usage (via benchmark.py):
+    python benchmark.py --url http://localhost:8080 --test conc --engine async
+
+Usage direct (un run):
+    python async_engine.py --url http://localhost:8080 --users 2000 --duration 30
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+
+# locustfile importe locust (monkey-patch gevent) : à faire avant aiohttp/ssl
+from locustfile import WAIT_MIN, WAIT_MAX, UserSampler, timeline_url
+from histogram import LatencyHistogram
+from benchmark import CPU_SATURATION, RAMP_FRACTION, ClientCpu
+from timeseries import TimeSeries
+
+import aiohttp
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+REQUEST_TIMEOUT = 60
+PERCENTILES = [50, 90, 95, 99]
+
+
+async def virtual_user(session: aiohttp.ClientSession, url: str, measure_start: float,
+                       deadline: float, hist: LatencyHistogram, errors: Counter,
+                       series: TimeSeries):
+    """
+    Boucle fermée d'un user virtuel jusqu'à `deadline` ; seules les requêtes
+    parties après `measure_start` et terminées avant `deadline` sont mesurées
+    (horloge perf_counter) : la mesure couvre exactement `duration` s.
+    """
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        error = None
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status != 200:
+                    error = f"Status {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        latency = (done - start) * 1000
+        series.record(latency, error is not None)
+        if measure_start <= start and done < deadline:
+            hist.record(latency)
+            if error:
+                errors[error] += 1
+        await asyncio.sleep(random.uniform(WAIT_MIN, WAIT_MAX))
+
+
+async def sample_cpu(cpu: ClientCpu, series: TimeSeries, tasks: list):
+    """Chaque seconde : CPU du client et nb de users virtuels encore actifs."""
+    while True:
+        await asyncio.sleep(1)
+        cpu.sample()
+        series.set_inflight(sum(not task.done() for task in tasks))
+
+
+async def run_users(url: str, num_users: int, duration: int, namespace: str,
+                    ramp: float, sampler: UserSampler, hist: LatencyHistogram,
+                    errors: Counter, cpu: ClientCpu, series: TimeSeries, probe):
+    """
+    Démarre `num_users` users virtuels régulièrement sur `ramp` s, puis
+    mesure pendant `duration` s ; `probe` est appelé au début et à la fin de
+    la mesure.
+    """
+    tasks = []
+    cpu_task = asyncio.create_task(sample_cpu(cpu, series, tasks))
+    connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(url, connector=connector, timeout=timeout) as session:
+        origin = time.perf_counter()
+        measure_start = origin + ramp
+        deadline = measure_start + duration
+        series.start(time.time(), origin)
+        for k in range(num_users):
+            # Démarrages planifiés (et non sleeps cumulés) : la rampe dure `ramp` s
+            await asyncio.sleep(max(0.0, origin + k * ramp / num_users - time.perf_counter()))
+            path = timeline_url(sampler.sample(), namespace or "")
+            tasks.append(asyncio.create_task(
+                virtual_user(session, path, measure_start, deadline, hist, errors, series)))
+        # Mesure CPU du régime établi seulement
+        await asyncio.sleep(max(0.0, measure_start - time.perf_counter()))
+        cpu.reset()
+        probe()
+        await asyncio.gather(*tasks)
+    cpu_task.cancel()
+    probe()
+
+
+def run_async(url: str, num_users: int, duration: int = 60, namespace: str = None,
+              hist_file: str = None, sampler: UserSampler = None, probe=None) -> dict:
+    """
+    Lance un run du moteur asyncio et retourne les mêmes métriques que
+    `benchmark.run_locust` (moyenne, percentiles, max, débit, erreurs,
+    série par seconde), sur les `duration` s qui suivent la montée en charge.
+    `probe`, s'il est fourni, est appelé au début et à la fin de la mesure.
+    """
+    ramp = duration * RAMP_FRACTION
+    hist = LatencyHistogram()
+    errors = Counter()
+    series = TimeSeries()
+
+    print(f"  Async: {num_users} users, rampe {ramp:.0f}s + {duration}s...", end=" ", flush=True)
+    sampler = sampler or UserSampler()
+    cpu = ClientCpu([os.getpid()])
+    series.warmup = int(ramp)
+    coro = run_users(url, num_users, duration, namespace, ramp, sampler, hist, errors, cpu,
+                     series, probe or (lambda: None))
+    if uvloop is not None:
+        uvloop.run(coro)
+    else:
+        asyncio.run(coro)
+
+    failures = sum(errors.values())
+    metrics = {
+        "temps_moyen": round(hist.mean(), 2),
+        "echecs": failures,
+        "requetes": hist.total,
+        "max": round(hist.percentile(100), 2),
+        "rps": round(hist.total / duration, 2),
+        "erreurs": dict(errors),
+        "cpu_client": round(cpu.busiest(), 1),
+        "hist": hist,
+        "series": series,
+        "echauffement": round(ramp),
+        "duree": duration,
+    }
+    metrics["client_sature"] = metrics["cpu_client"] >= CPU_SATURATION
+    for p in PERCENTILES:
+        metrics[f"p{p}"] = round(hist.percentile(p), 2)
+    if hist_file:
+        hist.save(hist_file)
+
+    print(f"Avg={metrics['temps_moyen']}ms, p50={metrics['p50']}ms, "
+          f"p99={metrics['p99']}ms, RPS={metrics['rps']}, Échecs={failures}, "
+          f"CPU client={metrics['cpu_client']}%")
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Moteur de charge asyncio pour TinyInsta")
+    parser.add_argument("--url", required=True, help="URL de l'app")
+    parser.add_argument("--users", type=int, default=1000, help="Nb de users virtuels")
+    parser.add_argument("--duration", type=int, default=60, help="Durée du run (s)")
+    parser.add_argument("--namespace", help="Namespace Datastore du dataset ciblé")
+    parser.add_argument("--hist", help="Fichier où écrire l'histogramme des latences")
+    args = parser.parse_args()
+
+    run_async(args.url, args.users, args.duration, args.namespace, args.hist)
+
+
+if __name__ == "__main__":
+    main()
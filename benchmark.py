@@ -6,81 +6,746 @@ Usage:
     python benchmark.py --url https://APP.appspot.com --test conc --output out
     python benchmark.py --url https://APP.appspot.com --test post --posts 100 --output out
     python benchmark.py --url https://APP.appspot.com --test fanout --followers 50 --output out
+    python benchmark.py --url https://APP.appspot.com --test fanout --followers 50 --namespace fanout50
+    python benchmark.py --url https://APP.appspot.com --test fanout --followers 50 --mode open --rate 200
+    python benchmark.py --url https://APP.appspot.com --test conc --engine async
+    python benchmark.py --url https://APP.appspot.com --test conc --profile mixed --zipf 1.2
+    python benchmark.py --url https://APP.appspot.com --test scroll --pages 20 --namespace post1000
+    python benchmark.py --url https://APP.appspot.com --test write --namespace write
+    python benchmark.py --url https://APP.appspot.com --test capacity --slo-p99 300 --namespace conc
+    python benchmark.py --url https://APP.appspot.com --test conc --workers auto
 """
 
-import subprocess
-import re
+import argparse
 import csv
 import os
-import argparse
-import time
+import re
+import socket
+import subprocess
 import sys
+import time
+from collections import Counter
+
+try:
+    import gevent
+    import psutil
+    from gevent.pool import Pool
+    from locust.env import Environment
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    print("\n❌ Locust non installé! Installez: pip install locust")
+    sys.exit(1)
+
+from cache import STATS as CACHE_STATS
+from histogram import LatencyHistogram
+from results import RESULTS_DB, ResultStore, default_label, git_revision
+from storage import add_storage_arguments, make_storage
+from timeseries import TimeSeries
+from locustfile import (PROFILES, DEFAULT_PROFILE, ZIPF_EXPONENT, SCROLL_PAGES, SERVER_PHASES,
+                        SERVER_TIMING_TYPE, TinyInstaUser, UserSampler, profile_user_class,
+                        server_timing_name, timeline_url)
 
 
 # Configuration
 NB_USERS = 1000
 NB_RUNS = 3
 CONCURRENCE_FIXE = 50
-TEST_DURATION = 60
+TEST_DURATION = 60      # Durée max de mesure d'un run (fixe avec --fixed-duration)
+STOP_TIMEOUT = 10
+# Montée en charge : au moins 10 users/s, plus vite au-delà pour que la rampe
+# dure au plus RAMP_FRACTION de la durée du run (sondes de milliers de users)
+MIN_SPAWN_RATE = 10
+RAMP_FRACTION = 0.2
 
+# Échauffement : au moins WARMUP_MIN s après la montée en charge, au plus
+# WARMUP_MAX s ; régime établi quand deux fenêtres consécutives de
+# STEADY_WINDOW s ont un débit et une latence moyenne à STEADY_TOLERANCE près
+WARMUP_MIN = 5
+WARMUP_MAX = 60
+STEADY_WINDOW = 5
+STEADY_TOLERANCE = 0.1
+# Mesure : au moins MIN_MEASURE s, puis arrêt dès que l'intervalle de
+# confiance à 95 % de la latence moyenne (moyennes par seconde) est à CI_TARGET près
+MIN_MEASURE = 20
+CI_TARGET = 0.05
 
-def run_locust(url: str, num_users: int, duration: int = 60) -> dict:
-    spawn_rate = min(num_users, 10)
-    
-    cmd = [
-        "locust",
-        "-f", "locustfile.py",
-        "--headless",
-        "--host", url,
-        "-u", str(num_users),
-        "-r", str(spawn_rate),
-        "--run-time", f"{duration}s",
-        "--only-summary",
-        "--stop-timeout", "10"
-    ]
-    
+# Génération distribuée : workers Locust locaux, seuil de saturation du client
+LOCUSTFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locustfile.py")
+WORKER_START_TIMEOUT = 60
+CPU_SATURATION = 90
+PERCENTILES = [50, 90, 95, 99]
+
+# Boucle ouverte : débit cible (req/s) et requêtes en vol max côté client
+RATE_FIXE = 100
+ARRIVAL_RATES = [10, 50, 100, 200, 500, 1000]
+MAX_INFLIGHT = 1000
+REQUEST_TIMEOUT = 60
+
+# Défilement : nb de pages lues à la suite par chaque user (test scroll)
+SCROLL_DEPTH = 20
+
+# Capacité : SLO de p99 (ms), taux d'échec toléré, précision relative de la
+# recherche, durée d'une sonde (s) et charge max explorée (users ou req/s)
+SLO_P99 = 500
+SLO_ERROR_RATE = 0.01
+CAPACITY_TOLERANCE = 0.1
+PROBE_DURATION = 30
+CAPACITY_START_LOAD = 10
+CAPACITY_MAX_LOAD = 10000
+
+# Écriture : paliers de nb de followers des auteurs, et nb d'auteurs par palier
+WRITE_FOLLOWERS = [10, 100, 1000, 10000]
+WRITE_AUTHORS = 10
+# Candidats lus au plus par auteur retenu (graphe du manifest vs follows écrits)
+WRITE_CANDIDATES = 3
+
+# Lectures de /api/cache/stats par relevé : repère les instances du backend memory
+CACHE_PROBES = 5
+
+FIELDNAMES = ["PARAM", "AVG_TIME", "RUN", "FAILED",
+              "P50", "P90", "P95", "P99", "MAX", "RPS", "REQUESTS", "FAILURES", "ERRORS",
+              "MODE", "RATE", "P50_RAW", "P90_RAW", "P95_RAW", "P99_RAW", "PROFILE",
+              "CACHE_HITS", "CACHE_MISSES", "CACHE_HIT_RATIO", "CACHE_EVICTIONS", "CACHE_INVALIDATIONS",
+              "WARMUP_S", "DURATION_S", "STEADY",
+              "WORKERS", "CLIENT_CPU", "CLIENT_SATURATED",
+              *(f"SERVER_{phase.upper()}_P{p}" for phase in SERVER_PHASES + ["rpc"] for p in (50, 99))]
+
+
+def hist_path(output_dir: str, test: str, param: int, run: int) -> str:
+    """Fichier de l'histogramme de latences d'un run (fusionné ensuite par config)."""
+    hist_dir = os.path.join(output_dir, "hist")
+    os.makedirs(hist_dir, exist_ok=True)
+    return os.path.join(hist_dir, f"{test}_{param}_run{run}.hdr")
+
+
+def server_hist_path(output_dir: str, test: str, param: int, run: int, phase: str) -> str:
+    """Fichier de l'histogramme d'une phase Server-Timing d'un run (ou du nb de RPC)."""
+    server_dir = os.path.join(output_dir, "server")
+    os.makedirs(server_dir, exist_ok=True)
+    return os.path.join(server_dir, f"{test}_{param}_run{run}_{phase}.hdr")
+
+
+def series_path(output_dir: str, test: str, param: int, run: int) -> str:
+    """Fichier de la série par seconde d'un run."""
+    series_dir = os.path.join(output_dir, "series")
+    os.makedirs(series_dir, exist_ok=True)
+    return os.path.join(series_dir, f"{test}_{param}_run{run}.tis")
+
+
+class RunPhases:
+    """
+    Découpe un run Locust en échauffement puis mesure à partir de la série
+    par seconde (nb de requêtes, somme des latences) de toutes les requêtes.
+    """
+
+    def __init__(self, max_measure: int):
+        self.max_measure = max_measure
+        self.start = time.perf_counter()
+        self.counts = Counter()
+        self.sums = Counter()
+        self.ramp_end = None        # Seconde de fin de la montée en charge
+        self.measure_start = None   # Seconde de début de la mesure
+        self.steady = False
+
+    def elapsed(self) -> int:
+        return int(time.perf_counter() - self.start)
+
+    def record(self, response_time: float, count: int = 1):
+        """Ajoute `count` requêtes dont les latences totalisent `response_time` ms."""
+        second = self.elapsed()
+        self.counts[second] += count
+        self.sums[second] += response_time
+
+    def window(self, first: int, last: int) -> tuple:
+        """(débit, latence moyenne) des secondes [first, last)."""
+        count = sum(self.counts[s] for s in range(first, last))
+        total = sum(self.sums[s] for s in range(first, last))
+        return count / (last - first), total / count if count else 0.0
+
+    def warmed_up(self, now: int) -> bool:
+        """Vrai dès le régime établi (ou WARMUP_MAX atteint, self.steady reste faux)."""
+        warmup = now - self.ramp_end
+        if warmup < max(WARMUP_MIN, 2 * STEADY_WINDOW):
+            return False
+        if warmup >= WARMUP_MAX:
+            return True
+        before = self.window(now - 2 * STEADY_WINDOW, now - STEADY_WINDOW)
+        last = self.window(now - STEADY_WINDOW, now)
+        self.steady = all(b > 0 and abs(l - b) / b <= STEADY_TOLERANCE for b, l in zip(before, last))
+        return self.steady
+
+    def converged(self, now: int) -> bool:
+        """Vrai quand l'IC à 95 % de la latence moyenne est assez serré (ou max atteint)."""
+        seconds = now - self.measure_start
+        if seconds >= self.max_measure:
+            return True
+        if seconds < MIN_MEASURE:
+            return False
+        means = [self.sums[s] / self.counts[s]
+                 for s in range(self.measure_start, now) if self.counts[s]]
+        if len(means) < 2:
+            return False
+        mean = sum(means) / len(means)
+        std = (sum((m - mean) ** 2 for m in means) / (len(means) - 1)) ** 0.5
+        return 1.96 * std / len(means) ** 0.5 <= CI_TARGET * mean
+
+
+def locust_metrics(env: Environment, name: str, hist: LatencyHistogram, duration: int,
+                   method: str = "GET") -> dict:
+    """Métriques d'une entrée des stats Locust, percentiles tirés de son histogramme."""
+    stats = env.stats.get(name, method)
+    metrics = {
+        "temps_moyen": round(stats.avg_response_time, 2),
+        "echecs": stats.num_failures,
+        "requetes": stats.num_requests,
+        "max": round(hist.percentile(100), 2),
+        # Débit sur la durée du run (total_rps ne couvre que la dernière fenêtre)
+        "rps": round(stats.num_requests / duration, 2),
+        "erreurs": {str(e.error): e.occurrences for e in env.stats.errors.values()
+                    if e.name == name},
+    }
+    for p in PERCENTILES:
+        metrics[f"p{p}"] = round(hist.percentile(p), 2)
+    return metrics
+
+
+def start_workers(runner, workers: int, port: int, options: argparse.Namespace) -> list:
+    """
+    Lance `workers` processus Locust worker (locustfile.py) reliés au master
+    local sur `port`, et attend qu'ils soient tous prêts. Les options de
+    TinyInsta leur sont passées par variables d'environnement.
+    """
+    env_vars = {**os.environ,
+                "TINYINSTA_NAMESPACE": options.namespace,
+                "TINYINSTA_WORKLOAD": options.workload,
+                "TINYINSTA_DATASET_USERS": str(options.dataset_users),
+                "TINYINSTA_ZIPF": str(options.zipf),
+                "TINYINSTA_SCROLL_PAGES": str(options.scroll_pages),
+                "TINYINSTA_WRITE_TARGETS": options.write_targets}
+    command = [sys.executable, "-m", "locust", "-f", LOCUSTFILE, "--worker",
+               "--master-host", "127.0.0.1", "--master-port", str(port), "--loglevel", "WARNING"]
+    processes = [subprocess.Popen(command, env=env_vars) for _ in range(workers)]
+    deadline = time.perf_counter() + WORKER_START_TIMEOUT
+    while len(runner.clients.ready) < workers:
+        if time.perf_counter() > deadline or any(p.poll() is not None for p in processes):
+            stop_workers(processes)
+            raise RuntimeError(f"{len(runner.clients.ready)}/{workers} workers Locust prêts")
+        gevent.sleep(0.2)
+    return processes
+
+
+def stop_workers(processes: list):
+    """Arrête les processus workers encore vivants."""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ClientCpu:
+    """Échantillonne chaque seconde l'utilisation CPU des processus générateurs de charge."""
+
+    def __init__(self, pids: list):
+        self.processes = [psutil.Process(pid) for pid in pids]
+        for process in self.processes:
+            process.cpu_percent(None)
+        self.samples = {process.pid: [] for process in self.processes}
+
+    def sample(self):
+        for process in self.processes:
+            try:
+                self.samples[process.pid].append(process.cpu_percent(None))
+            except psutil.Error:
+                pass
+
+    def reset(self):
+        for samples in self.samples.values():
+            samples.clear()
+
+    def busiest(self) -> float:
+        """Utilisation CPU moyenne (%) du processus le plus chargé."""
+        return max((sum(s) / len(s) for s in self.samples.values() if s), default=0.0)
+
+
+def run_locust(url: str, num_users: int, duration: int = 60, namespace: str = None,
+               hist_file: str = None, profile: str = DEFAULT_PROFILE,
+               dataset_users: int = NB_USERS, zipf: float = ZIPF_EXPONENT,
+               scroll_pages: int = SCROLL_PAGES, write_targets: str = "",
+               adaptive: bool = True, workers: int = 0, probe=None) -> dict:
+    """
+    Lance un run Locust et retourne les statistiques de /api/timeline :
+    moyenne, percentiles, max, débit et répartition des erreurs. Chaque
+    latence est enregistrée dans un histogramme log-linéaire, écrit dans
+    `hist_file` si fourni. Chaque nom de requête est résumé dans
+    `metrics["requetes_par_nom"]` et les pages du défilement
+    ("/api/timeline [page N]") dans `metrics["pages"]` ({N: métriques}),
+    histogramme sous la clé "hist". La série par seconde de toutes les
+    requêtes du run, échauffement compris, est sous `metrics["series"]`.
+    Les phases Server-Timing de /api/timeline (pages du défilement comprises)
+    sont dans `metrics["serveur"]`
+    ({phase: métriques}, "rpc" pour le nb de RPC Datastore) ; elles ne
+    comptent ni dans la série ni dans la détection du régime établi.
+
+    Avec `workers` = 0, Locust tourne dans ce processus (LocalRunner). Sinon
+    ce processus est le master et `workers` processus workers génèrent la
+    charge ; leurs histogrammes arrivent avec leurs rapports de stats. Dans
+    les deux cas l'utilisation CPU des générateurs est échantillonnée et le
+    run est marqué saturé côté client si un processus dépasse CPU_SATURATION %.
+
+    En mode adaptatif, les requêtes de l'échauffement (montée en charge puis
+    attente du régime établi, cf. RunPhases) sont écartées, et la mesure
+    s'arrête dès que la latence moyenne a convergé, au plus `duration` s.
+    Sinon le run dure `duration` s et toutes les requêtes comptent.
+
+    `probe` (sans argument), s'il est fourni, est appelé au début et à la fin
+    de la mesure (relevé des compteurs du cache, cf. run_load).
+    """
+    probe = probe or (lambda: None)
+    spawn_rate = max(min(num_users, MIN_SPAWN_RATE), num_users / (duration * RAMP_FRACTION))
+    options = argparse.Namespace(namespace=namespace or "", workload=profile,
+                                 dataset_users=dataset_users, zipf=zipf,
+                                 scroll_pages=scroll_pages, write_targets=write_targets,
+                                 headless=True, enable_rebalancing=False)
+    hists = {"/api/timeline": LatencyHistogram()}
+    methods = {"/api/timeline": "GET"}
+
+    phases = RunPhases(duration)
+    series = TimeSeries()
+
+    def measuring() -> bool:
+        return phases.measure_start is not None or not adaptive
+
+    def on_request(request_type, name, response_time, exception=None, **kwargs):
+        if request_type != SERVER_TIMING_TYPE:
+            phases.record(response_time)
+            series.record(response_time, exception is not None)
+        if measuring():
+            hists.setdefault(name, LatencyHistogram()).record(response_time)
+        methods[name] = request_type
+
+    def on_worker_report(client_id, data):
+        for name, (request_type, count, total, raw, errors) in data.get("tinyinsta_hists", {}).items():
+            hist = LatencyHistogram.from_bytes(raw)
+            if request_type != SERVER_TIMING_TYPE:
+                phases.record(total, count)
+                series.record_hist(hist, errors)
+            if measuring():
+                hists.setdefault(name, LatencyHistogram()).merge(hist)
+            methods[name] = request_type
+
+    def monitor(env, runner, cpu):
+        """Échantillonnage CPU, échauffement puis mesure, une décision par seconde écoulée."""
+        while True:
+            gevent.sleep(1)
+            cpu.sample()
+            series.set_inflight(runner.user_count)
+            if not adaptive:
+                continue
+            now = phases.elapsed()
+            if phases.ramp_end is None:
+                if runner.state != "spawning":
+                    phases.ramp_end = now
+            elif phases.measure_start is None:
+                if phases.warmed_up(now):
+                    env.stats.reset_all()
+                    hists.clear()
+                    hists["/api/timeline"] = LatencyHistogram()
+                    cpu.reset()
+                    probe()
+                    phases.measure_start = now
+                    series.warmup = now
+            elif phases.converged(now):
+                runner.quit()
+                return
+
+    processes = []
     try:
-        print(f"  Locust: {num_users} users, {duration}s...", end=" ", flush=True)
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=duration + 30)
-        output = result.stdout + result.stderr
-        
-        temps_moyen = 0
-        echecs = 0
-        
-        # Parser statistiques sortie Locust
-        lines = output.split('\n')
-        for line in lines:
-            if '/api/timeline' in line and 'GET' in line:
-                parts = line.split()
-                try:
-                    if len(parts) >= 7:
-                        echecs = int(parts[3])
-                        temps_moyen = float(parts[4])
-                        break
-                except (ValueError, IndexError):
-                    continue
-        
-        # gérer échecs
-        if temps_moyen == 0:
-            match = re.search(r'Average.*?(\d+\.?\d*)\s*ms', output, re.IGNORECASE)
-            if match:
-                temps_moyen = float(match.group(1))
-            match = re.search(r'(\d+)\s+failed', output, re.IGNORECASE)
+        mode = f", {workers} workers" if workers else ""
+        print(f"  Locust: {num_users} users, {duration}s{mode}...", end=" ", flush=True)
+        if workers:
+            # Les workers ne connaissent que les classes du locustfile (profil via TINYINSTA_WORKLOAD)
+            env = Environment(user_classes=[TinyInstaUser], host=url, parsed_options=options,
+                              stop_timeout=STOP_TIMEOUT)
+            env.events.worker_report.add_listener(on_worker_report)
+            runner = env.create_master_runner("127.0.0.1", free_port())
+            processes = start_workers(runner, workers, runner.master_bind_port, options)
+        else:
+            env = Environment(user_classes=[profile_user_class(profile)], host=url,
+                              parsed_options=options, stop_timeout=STOP_TIMEOUT)
+            env.events.request.add_listener(on_request)
+            runner = env.create_local_runner()
+        cpu = ClientCpu([os.getpid()] + [p.pid for p in processes])
+        phases.start = time.perf_counter()
+        series.start(time.time(), phases.start)
+        # Avant start : celui du master ne rend la main qu'après la montée en charge
+        monitor_greenlet = gevent.spawn(monitor, env, runner, cpu)
+        if not adaptive:
+            probe()
+            gevent.spawn_later(duration, runner.quit)
+        runner.start(num_users, spawn_rate=spawn_rate)
+        runner.greenlet.join()
+        monitor_greenlet.kill()
+        probe()
+
+        measured = duration
+        if adaptive:
+            measured = max(1, phases.elapsed() - phases.measure_start)
+        metrics = locust_metrics(env, "/api/timeline", hists["/api/timeline"], measured)
+        metrics["erreurs"] = {str(e.error): e.occurrences for e in env.stats.errors.values()}
+        metrics["requetes_par_nom"] = {
+            name: {**locust_metrics(env, name, hist, measured, methods[name]), "hist": hist}
+            for name, hist in hists.items()}
+        metrics["hist"] = hists["/api/timeline"]
+        metrics["series"] = series
+        metrics["duree"] = measured
+        if adaptive:
+            metrics["echauffement"] = phases.measure_start
+            metrics["regime_etabli"] = phases.steady
+        metrics["workers"] = workers
+        metrics["cpu_client"] = round(cpu.busiest(), 1)
+        metrics["client_sature"] = metrics["cpu_client"] >= CPU_SATURATION
+        metrics["pages"] = {}
+        for name, by_name in metrics["requetes_par_nom"].items():
+            match = re.search(r"\[page (\d+)\]$", name)
             if match:
-                echecs = int(match.group(1))
-        
-        print(f"Avg={temps_moyen}ms, Échecs={echecs}")
-        return {"temps_moyen": round(temps_moyen, 2), "echecs": echecs}
-        
-    except subprocess.TimeoutExpired:
-        print("TIMEOUT!")
-        return {"temps_moyen": -1, "echecs": -1}
-    except FileNotFoundError:
-        print("\n❌ Locust non installé! Installez: pip install locust")
-        sys.exit(1)
+                metrics["pages"][int(match.group(1))] = by_name
+        metrics["serveur"] = {phase: metrics["requetes_par_nom"][server_timing_name(phase)]
+                              for phase in SERVER_PHASES + ["rpc"]
+                              if server_timing_name(phase) in metrics["requetes_par_nom"]}
+        if hist_file:
+            hists["/api/timeline"].save(hist_file)
+
+        warmup = ""
+        if adaptive:
+            warmup = (f" [échauffement {phases.measure_start}s"
+                      f"{'' if phases.steady else ' sans régime établi'}, mesure {measured}s]")
+        if metrics["requetes"] or not metrics["pages"]:
+            print(f"Avg={metrics['temps_moyen']}ms, p50={metrics['p50']}ms, "
+                  f"p99={metrics['p99']}ms, RPS={metrics['rps']}, Échecs={metrics['echecs']}, "
+                  f"CPU client={metrics['cpu_client']}%{warmup}")
+        else:
+            # Profil scroll : pas de /api/timeline simple, le détail par page suit
+            pages = metrics["pages"].values()
+            print(f"{len(metrics['pages'])} pages, {sum(m['requetes'] for m in pages)} req., "
+                  f"RPS={round(sum(m['rps'] for m in pages), 2)}, "
+                  f"Échecs={sum(m['echecs'] for m in pages)}, "
+                  f"CPU client={metrics['cpu_client']}%{warmup}")
+        if metrics["serveur"]:
+            print("  Serveur: " + ", ".join(
+                f"{phase} p50={m['p50']}{'' if phase == 'rpc' else 'ms'} "
+                f"p99={m['p99']}{'' if phase == 'rpc' else 'ms'}"
+                for phase, m in metrics["serveur"].items()))
+        if metrics["client_sature"]:
+            print(f"  ⚠️  Générateur de charge saturé (CPU >= {CPU_SATURATION}%) : "
+                  "augmenter --workers")
+        return metrics
+
     except Exception as e:
         print(f"Erreur: {e}")
-        return {"temps_moyen": -1, "echecs": -1}
+        return {"temps_moyen": -1, "echecs": -1, "requetes": 0, "max": -1, "rps": -1,
+                "erreurs": {}, **{f"p{p}": -1 for p in PERCENTILES}}
+    finally:
+        stop_workers(processes)
+
+
+def run_open_loop(url: str, rate: float, duration: int = 60, namespace: str = None,
+                  hist_file: str = None, max_inflight: int = MAX_INFLIGHT,
+                  sampler: UserSampler = None, probe=None) -> dict:
+    """
+    Charge en boucle ouverte : les requêtes timeline partent selon un planning
+    fixe de `rate` req/s, indépendamment des réponses. La latence corrigée est
+    mesurée depuis l'instant d'envoi prévu (correction de la coordinated
+    omission) ; la latence brute depuis l'envoi effectif. Si `max_inflight`
+    requêtes sont déjà en vol, l'envoi est retardé et ce retard est compté
+    dans la latence corrigée. Les requêtes encore en vol REQUEST_TIMEOUT s
+    après la fin du planning (les plus lentes) sont abandonnées et comptées
+    en échec, avec leur latence à l'abandon ; le débit est celui des requêtes
+    terminées, jusqu'à la dernière. La série par seconde (`metrics["series"]`)
+    relève les requêtes en vol plutôt que des users. `probe` est appelé avant
+    la première requête et après la dernière (cf. run_locust).
+    """
+    sampler = sampler or UserSampler()
+    probe = probe or (lambda: None)
+    session = requests.Session()
+    session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=max_inflight))
+    pool = Pool(max_inflight)
+    corrected = LatencyHistogram()
+    raw = LatencyHistogram()
+    errors = Counter()
+    series = TimeSeries()
+    inflight = {}   # greenlet -> [envoi prévu, envoi effectif]
+    last_done = 0.0
+
+    def send(intended: float):
+        nonlocal last_done
+        sent = time.perf_counter()
+        inflight[gevent.getcurrent()][1] = sent
+        error = None
+        try:
+            response = session.get(url + timeline_url(sampler.sample(), namespace or ""),
+                                   timeout=REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                error = f"Status {response.status_code}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        if error:
+            errors[error] += 1
+        done = last_done = time.perf_counter()
+        del inflight[gevent.getcurrent()]
+        raw.record((done - sent) * 1000)
+        corrected.record((done - intended) * 1000)
+        series.record((done - intended) * 1000, error is not None)
+
+    def sample_cpu():
+        while True:
+            gevent.sleep(1)
+            cpu.sample()
+            series.set_inflight(len(pool))
+
+    print(f"  Boucle ouverte: {rate} req/s, {duration}s...", end=" ", flush=True)
+    cpu = ClientCpu([os.getpid()])
+    cpu_greenlet = gevent.spawn(sample_cpu)
+    probe()
+    start = time.perf_counter()
+    series.start(time.time(), start)
+    for i in range(int(rate * duration)):
+        intended = start + i / rate
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            gevent.sleep(delay)
+        inflight[pool.spawn(send, intended)] = [intended, None]
+    pool.join(timeout=REQUEST_TIMEOUT)
+    # Abandonnées : comptées avec leur latence à l'abandon, sans quoi
+    # l'histogramme corrigé perdrait justement ses requêtes les plus lentes
+    abandoned = time.perf_counter()
+    killed = list(inflight.values())
+    pool.kill()
+    cpu_greenlet.kill()
+    for intended, sent in killed:
+        errors["Abandonnée"] += 1
+        corrected.record((abandoned - intended) * 1000)
+        series.record((abandoned - intended) * 1000, True)
+        if sent is not None:
+            raw.record((abandoned - sent) * 1000)
+    completed = corrected.total - len(killed)
+    probe()
+
+    failures = sum(errors.values())
+    metrics = {
+        "temps_moyen": round(corrected.mean(), 2),
+        "echecs": failures,
+        "requetes": corrected.total,
+        "max": round(corrected.percentile(100), 2),
+        "rps": round(completed / (last_done - start), 2) if completed else 0.0,
+        "erreurs": dict(errors),
+        "mode": "open",
+        "rate": rate,
+        "cpu_client": round(cpu.busiest(), 1),
+        "hist": corrected,
+        "series": series,
+    }
+    metrics["client_sature"] = metrics["cpu_client"] >= CPU_SATURATION
+    for p in PERCENTILES:
+        metrics[f"p{p}"] = round(corrected.percentile(p), 2)
+        metrics[f"p{p}_raw"] = round(raw.percentile(p), 2)
+    if hist_file:
+        corrected.save(hist_file)
+
+    print(f"p50={metrics['p50']}ms (brut {metrics['p50_raw']}ms), "
+          f"p99={metrics['p99']}ms (brut {metrics['p99_raw']}ms), "
+          f"RPS={metrics['rps']}, Échecs={failures}, CPU client={metrics['cpu_client']}%")
+    return metrics
+
+
+def cache_stats(url: str) -> dict:
+    """Compteurs du cache de timelines de l'app (None si l'app ne les expose pas)."""
+    try:
+        response = requests.get(f"{url.rstrip('/')}/api/cache/stats", timeout=10)
+        return response.json() if response.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def cache_snapshot(url: str, probes: int = CACHE_PROBES) -> dict:
+    """
+    Relevé des compteurs du cache : {instance: compteurs}, {} si l'app ne les
+    expose pas. Le backend redis est partagé (une lecture suffit) ; ceux du
+    backend memory sont propres à l'instance qui répond, `probes` lectures
+    repèrent les instances servies par le load balancer.
+    """
+    snapshot = {}
+    for _ in range(probes):
+        stats = cache_stats(url)
+        if stats is None:
+            return {}
+        snapshot[stats.get('instance', '')] = stats
+        if stats['backend'] != 'memory':
+            break
+    return snapshot
+
+
+def cache_delta(before: dict, after: dict) -> dict:
+    """
+    Compteurs du cache sur la fenêtre de mesure (relevés `before` / `after` de
+    cache_snapshot), None sans cache ou si le backend memory tourne sur
+    plusieurs instances : chacune n'en voit qu'une part.
+    """
+    if not before or not after:
+        return None
+    stats = next(iter(after.values()))
+    if stats['backend'] == 'none':
+        return None
+    if stats['backend'] == 'memory' and (len(after) > 1 or before.keys() != after.keys()):
+        print(f"  Cache (memory): {len(before.keys() | after.keys())} instances, "
+              "compteurs par instance non relevés")
+        return None
+    start = next(iter(before.values()))
+    return {'backend': stats['backend'], **{k: stats[k] - start[k] for k in CACHE_STATS}}
+
+
+def run_load(url: str, num_users: int, duration: int, options: argparse.Namespace,
+             hist_file: str = None) -> dict:
+    """
+    Lance un run avec le mode de charge choisi : boucle ouverte, ou boucle
+    fermée avec le moteur Locust ou asyncio. Les compteurs du cache de l'app
+    sont relevés au début et à la fin de la mesure (échauffement exclu, comme
+    les latences) : backend redis partagé, ou backend memory sur une seule
+    instance (cf. cache_delta).
+    """
+    sampler = UserSampler(options.dataset_users, options.zipf)
+    snapshots = []
+
+    def probe():
+        snapshots.append(cache_snapshot(url))
+
+    if options.mode == "open":
+        metrics = run_open_loop(url, options.rate, duration, options.namespace, hist_file,
+                                sampler=sampler, probe=probe)
+    elif options.engine == "async":
+        try:
+            from async_engine import run_async
+        except ImportError:
+            print("\n❌ aiohttp non installé! Installez: pip install aiohttp")
+            sys.exit(1)
+        metrics = run_async(url, num_users, duration, options.namespace, hist_file, sampler,
+                            probe)
+    else:
+        metrics = run_locust(url, num_users, duration, options.namespace, hist_file,
+                             options.profile, options.dataset_users, options.zipf,
+                             options.pages, options.write_targets, not options.fixed_duration,
+                             options.workers, probe)
+    cache = cache_delta(*snapshots) if len(snapshots) == 2 else None
+    if cache is not None:
+        metrics["cache"] = cache
+        print(f"  Cache ({cache['backend']}): {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['evictions']} évictions, {cache['invalidations']} invalidations")
+    return metrics
+
+
+def make_row(param: int, run: int, metrics: dict, profile: str = DEFAULT_PROFILE) -> dict:
+    """Convertit les métriques d'un run en ligne CSV."""
+    return {
+        "PARAM": param,
+        "AVG_TIME": f"{metrics['temps_moyen']}ms",
+        "RUN": run,
+        "FAILED": 1 if metrics['echecs'] > 0 else 0,
+        **{f"P{p}": metrics[f"p{p}"] for p in PERCENTILES},
+        "MAX": metrics['max'],
+        "RPS": metrics['rps'],
+        "REQUESTS": metrics['requetes'],
+        "FAILURES": metrics['echecs'],
+        "ERRORS": ";".join(f"{err}:{n}" for err, n in metrics['erreurs'].items()),
+        "MODE": metrics.get('mode', "closed"),
+        "RATE": metrics.get('rate', ""),
+        **{f"P{p}_RAW": metrics.get(f"p{p}_raw", "") for p in PERCENTILES},
+        "PROFILE": profile,
+        **cache_columns(metrics.get('cache')),
+        "WARMUP_S": metrics.get('echauffement', ""),
+        "DURATION_S": metrics.get('duree', ""),
+        "STEADY": {True: 1, False: 0}.get(metrics.get('regime_etabli'), ""),
+        "WORKERS": metrics.get('workers', ""),
+        "CLIENT_CPU": metrics.get('cpu_client', ""),
+        "CLIENT_SATURATED": {True: 1, False: 0}.get(metrics.get('client_sature'), ""),
+        **server_columns(metrics.get('serveur', {})),
+    }
+
+
+def server_columns(server: dict) -> dict:
+    """Colonnes CSV p50/p99 des phases Server-Timing (vides si l'app n'envoie pas l'en-tête)."""
+    return {f"SERVER_{phase.upper()}_P{p}": server[phase][f"p{p}"] if phase in server else ""
+            for phase in SERVER_PHASES + ["rpc"] for p in (50, 99)}
+
+
+def cache_columns(cache: dict) -> dict:
+    """Colonnes CSV de l'efficacité du cache (vides si l'app n'a pas de cache)."""
+    if not cache:
+        return {"CACHE_HITS": "", "CACHE_MISSES": "", "CACHE_HIT_RATIO": "",
+                "CACHE_EVICTIONS": "", "CACHE_INVALIDATIONS": ""}
+    lookups = cache["hits"] + cache["misses"]
+    return {"CACHE_HITS": cache["hits"], "CACHE_MISSES": cache["misses"],
+            "CACHE_HIT_RATIO": round(cache["hits"] / lookups, 4) if lookups else "",
+            "CACHE_EVICTIONS": cache["evictions"], "CACHE_INVALIDATIONS": cache["invalidations"]}
+
+
+def record_run(results: list, test: str, param: int, run: int, metrics: dict,
+               options: argparse.Namespace, users: int = CONCURRENCE_FIXE,
+               series: TimeSeries = None):
+    """
+    Ajoute la ligne CSV d'un run à `results`, écrit sa série par seconde
+    (`series` ou celle des métriques) et les histogrammes de ses phases
+    Server-Timing, et l'enregistre dans la base de résultats.
+    """
+    row = make_row(param, run, metrics, options.profile)
+    results.append(row)
+    series = series or metrics.get("series")
+    if series is not None:
+        series.save(series_path(options.output, test, param, run))
+    for phase, phase_metrics in metrics.get("serveur", {}).items():
+        phase_metrics["hist"].save(server_hist_path(options.output, test, param, run, phase))
+    if options.store is not None:
+        options.store.save_run(options.context, test, param, run, row, metrics,
+                               users if options.mode == "closed" else None, series)
+
+
+def dataset_storage(args: argparse.Namespace):
+    """Backend de stockage (--storage) du namespace ciblé, None s'il est indisponible."""
+    try:
+        return make_storage(args.storage, args.namespace or None, args.rpc_latency,
+                            args.entity_latency)
+    except Exception as e:  # Dépendances ou identifiants absents : seul le test write en a besoin
+        print(f"⚠️  Stockage {args.storage} indisponible ({type(e).__name__}: {e})")
+        return None
+
+
+def dataset_manifest(storage):
+    """Paramètres de seed.py du dataset ciblé (manifest), None s'ils sont illisibles."""
+    if storage is None:
+        return None
+    try:
+        from seed import load_manifest
+        return load_manifest(storage)
+    except Exception as e:  # Dépendances, identifiants ou réseau absents : le run continue
+        print(f"⚠️  Manifest du dataset illisible, non enregistré ({type(e).__name__}: {e})")
+        return None
+
+
+def run_context(args: argparse.Namespace) -> dict:
+    """Contexte commun aux runs de cette invocation, enregistré avec chacun d'eux."""
+    sha, dirty = git_revision()
+    return {"label": args.label or default_label(), "git_sha": sha, "git_dirty": dirty,
+            "url": args.url, "namespace": args.namespace, "dataset": args.dataset,
+            "engine": args.engine, "mode": args.mode, "workers": args.workers}
 
 
 def append_csv(results: list, csv_path: str, write_header: bool = False):
@@ -89,7 +754,7 @@ def append_csv(results: list, csv_path: str, write_header: bool = False):
     file_exists = os.path.exists(csv_path) and os.path.getsize(csv_path) > 0
     
     with open(csv_path, mode, newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["PARAM", "AVG_TIME", "RUN", "FAILED"])
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         if write_header or (mode == "a" and not file_exists):
             writer.writeheader()
         writer.writerows(results)
@@ -98,7 +763,7 @@ def append_csv(results: list, csv_path: str, write_header: bool = False):
 def write_csv(results: list, csv_path: str):
     """Écrit les résultats dans un fichier CSV """
     with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["PARAM", "AVG_TIME", "RUN", "FAILED"])
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
         writer.writerows(results)
     print(f"  Résultats sauvegardés: {csv_path}")
@@ -108,31 +773,34 @@ def write_csv(results: list, csv_path: str):
 # TEST CONCURRENCE
 # =============================================================================
 
-def test_conc(url: str, output_dir: str, prefix: str = "user"):
+def test_conc(url: str, output_dir: str, prefix: str = "user", options: argparse.Namespace = None):
+    """
+    Balaye la concurrence (boucle fermée) ou, en boucle ouverte, le débit
+    d'arrivée : PARAM est alors un nombre de req/s.
+    """
     print("\n" + "=" * 60)
     print("TEST CONCURRENCE ")
     print("=" * 60)
     
-    concurrences = [1, 10, 20, 50, 100, 1000]
+    open_loop = options.mode == "open"
+    concurrences = ARRIVAL_RATES if open_loop else [1, 10, 20, 50, 100, 1000]
     results = []
     
     for conc in concurrences:
-        print(f"\n--- {conc} utilisateurs simultanés ---")
+        if open_loop:
+            print(f"\n--- {conc} requêtes/s ---")
+        else:
+            print(f"\n--- {conc} utilisateurs simultanés ---")
         
         for run in range(1, NB_RUNS + 1):
             print(f"  Run {run}/{NB_RUNS}:", end=" ", flush=True)
             
             duration = 60 if conc >= 50 else 30
-            metrics = run_locust(url, conc, duration)
-            
-            results.append({
-                "PARAM": conc,
-                "AVG_TIME": f"{metrics['temps_moyen']}ms",
-                "RUN": run,
-                "FAILED": 1 if metrics['echecs'] > 0 else 0
-            })
+            run_options = argparse.Namespace(**{**vars(options), "rate": conc})
+            metrics = run_load(url, conc, duration, run_options,
+                               hist_path(output_dir, "conc", conc, run))
             
-            time.sleep(5)
+            record_run(results, "conc", conc, run, metrics, options, users=conc)
     
     write_csv(results, os.path.join(output_dir, "conc.csv"))
     return results
@@ -142,7 +810,8 @@ def test_conc(url: str, output_dir: str, prefix: str = "user"):
 # TEST POSTS
 # =============================================================================
 
-def test_post_single(url: str, output_dir: str, posts_per_user: int, prefix: str = "user"):
+def test_post_single(url: str, output_dir: str, posts_per_user: int, prefix: str = "user",
+                     options: argparse.Namespace = None):
     """Test pour une configuration de posts donnée."""
     print(f"\n--- Config: {posts_per_user} posts/user ---")
     
@@ -151,16 +820,10 @@ def test_post_single(url: str, output_dir: str, posts_per_user: int, prefix: str
     for run in range(1, NB_RUNS + 1):
         print(f"  Run {run}/{NB_RUNS}:", end=" ", flush=True)
         
-        metrics = run_locust(url, CONCURRENCE_FIXE, TEST_DURATION)
+        metrics = run_load(url, CONCURRENCE_FIXE, TEST_DURATION, options,
+                           hist_path(output_dir, "post", posts_per_user, run))
         
-        results.append({
-            "PARAM": posts_per_user,
-            "AVG_TIME": f"{metrics['temps_moyen']}ms",
-            "RUN": run,
-            "FAILED": 1 if metrics['echecs'] > 0 else 0
-        })
-        
-        time.sleep(5)
+        record_run(results, "post", posts_per_user, run, metrics, options)
     
     csv_path = os.path.join(output_dir, "post.csv")
     append_csv(results, csv_path)
@@ -173,7 +836,8 @@ def test_post_single(url: str, output_dir: str, posts_per_user: int, prefix: str
 # TEST FANOUT
 # =============================================================================
 
-def test_fanout_single(url: str, output_dir: str, followers: int, prefix: str = "user"):
+def test_fanout_single(url: str, output_dir: str, followers: int, prefix: str = "user",
+                       options: argparse.Namespace = None):
     """Test pour une configuration de followers donnée."""
     print(f"\n--- Config: {followers} followers ---")
     
@@ -182,16 +846,10 @@ def test_fanout_single(url: str, output_dir: str, followers: int, prefix: str =
     for run in range(1, NB_RUNS + 1):
         print(f"  Run {run}/{NB_RUNS}:", end=" ", flush=True)
         
-        metrics = run_locust(url, CONCURRENCE_FIXE, TEST_DURATION)
-        
-        results.append({
-            "PARAM": followers,
-            "AVG_TIME": f"{metrics['temps_moyen']}ms",
-            "RUN": run,
-            "FAILED": 1 if metrics['echecs'] > 0 else 0
-        })
+        metrics = run_load(url, CONCURRENCE_FIXE, TEST_DURATION, options,
+                           hist_path(output_dir, "fanout", followers, run))
         
-        time.sleep(5)
+        record_run(results, "fanout", followers, run, metrics, options)
     
     csv_path = os.path.join(output_dir, "fanout.csv")
     append_csv(results, csv_path)
@@ -200,20 +858,265 @@ def test_fanout_single(url: str, output_dir: str, followers: int, prefix: str =
     return results
 
 
+# =============================================================================
+# TEST CAPACITÉ
+# =============================================================================
+
+def meets_slo(metrics: dict, slo_p99: float, max_error_rate: float = SLO_ERROR_RATE) -> bool:
+    """Vrai si un run respecte le SLO : p99 <= slo_p99 et taux d'échec toléré."""
+    if metrics["requetes"] <= 0 or metrics["p99"] < 0:
+        return False
+    return metrics["p99"] <= slo_p99 and metrics["echecs"] / metrics["requetes"] <= max_error_rate
+
+
+def test_capacity(url: str, output_dir: str, prefix: str = "user",
+                  options: argparse.Namespace = None):
+    """
+    Recherche la charge max (users en boucle fermée, req/s en boucle ouverte)
+    qui respecte le SLO de p99 : rampe exponentielle (x2) jusqu'à la première
+    violation, puis bisection entre la dernière charge bonne et la première
+    mauvaise jusqu'à une précision relative de --tolerance. La recherche
+    s'arrête aussi quand le débit mesuré ne progresse plus entre deux sondes
+    bonnes (plateau : le serveur est saturé avant le SLO).
+    Chaque sonde est une ligne de capacity.csv (RUN = n° de sonde).
+    """
+    print("\n" + "=" * 60)
+    print(f"TEST CAPACITÉ (SLO p99 <= {options.slo_p99}ms)")
+    print("=" * 60)
+
+    open_loop = options.mode == "open"
+    unit = "req/s" if open_loop else "users"
+    results = []
+    probes = {}
+    load_time = 0.0     # Durée réelle des sondes (rampe et échauffement compris)
+
+    def probe(load: int) -> bool:
+        nonlocal load_time
+        if load not in probes:
+            print(f"\n--- Sonde {len(probes) + 1}: {load} {unit} ---")
+            print("  ", end="", flush=True)
+            run_options = argparse.Namespace(**{**vars(options), "rate": load})
+            start = time.time()
+            metrics = run_load(url, load, options.probe_duration, run_options,
+                               hist_path(output_dir, "capacity", load, len(probes) + 1))
+            load_time += time.time() - start
+            record_run(results, "capacity", load, len(probes) + 1, metrics, options, users=load)
+            probes[load] = metrics
+            print(f"  -> {'OK' if meets_slo(metrics, options.slo_p99) else 'hors SLO'}")
+        return meets_slo(probes[load], options.slo_p99)
+
+    # Rampe exponentielle
+    good, bad, load = 0, None, CAPACITY_START_LOAD
+    while load <= options.max_load:
+        if not probe(load):
+            bad = load
+            break
+        plateau = good and probes[load]["rps"] < probes[good]["rps"] * (1 + options.tolerance)
+        good = load
+        if plateau:
+            print(f"  Débit stable entre deux sondes : saturation à ~{probes[good]['rps']} req/s")
+            break
+        load *= 2
+
+    # Bisection entre la dernière charge bonne et la première mauvaise
+    while bad is not None and good and bad - good > max(1, options.tolerance * good):
+        mid = (good + bad) // 2
+        if probe(mid):
+            good = mid
+        else:
+            bad = mid
+
+    write_csv(sorted(results, key=lambda r: r["PARAM"]), os.path.join(output_dir, "capacity.csv"))
+    load_minutes = load_time / 60
+    if good:
+        print(f"\n✓ Capacité: {good} {unit} ({probes[good]['rps']} req/s, "
+              f"p99={probes[good]['p99']}ms) en {len(probes)} sondes ({load_minutes:.1f} min de charge)")
+    else:
+        print(f"\n❌ SLO violé dès la première sonde ({len(probes)} sonde)")
+    return good, results
+
+
+# =============================================================================
+# TEST DÉFILEMENT
+# =============================================================================
+
+def test_scroll(url: str, output_dir: str, prefix: str = "user",
+                options: argparse.Namespace = None):
+    """
+    Chaque user Locust fait défiler sa timeline sur `--pages` pages en suivant
+    le curseur ; PARAM est la profondeur de la page (1 = première page).
+    """
+    print("\n" + "=" * 60)
+    print(f"TEST DÉFILEMENT ({options.pages} pages)")
+    print("=" * 60)
+
+    results = []
+
+    for run in range(1, NB_RUNS + 1):
+        print(f"  Run {run}/{NB_RUNS}:", end=" ", flush=True)
+
+        metrics = run_load(url, CONCURRENCE_FIXE, TEST_DURATION, options)
+
+        for page, page_metrics in sorted(metrics.get("pages", {}).items()):
+            page_metrics["hist"].save(hist_path(output_dir, "scroll", page, run))
+            record_run(results, "scroll", page, run, page_metrics, options)
+            print(f"    Page {page}: p50={page_metrics['p50']}ms, "
+                  f"p99={page_metrics['p99']}ms ({page_metrics['requetes']} req.)")
+
+    write_csv(results, os.path.join(output_dir, "scroll.csv"))
+    return results
+
+
+# =============================================================================
+# TEST ÉCRITURE
+# =============================================================================
+
+def write_targets(storage, namespace: str, buckets: list = WRITE_FOLLOWERS,
+                  per_bucket: int = WRITE_AUTHORS) -> dict:
+    """
+    Auteurs du dataset classés par nb de followers : pour chaque palier b,
+    jusqu'à `per_bucket` auteurs ayant entre b et 2b followers, chacun avec
+    un de ses followers pour mesurer la visibilité. Le graphe recalculé à
+    partir du manifest ne sert qu'à présélectionner les candidats : leurs
+    followers sont lus dans `storage` par la requête de l'app
+    (`User.follows = auteur`), qui fait foi. Retourne {palier: [(id auteur,
+    id follower)]}, ids à partir de 1.
+    """
+    try:
+        import numpy as np
+        from seed import follow_graph, load_manifest
+    except ImportError:
+        print("\n❌ numpy non installé! Installez: pip install numpy")
+        sys.exit(1)
+    if storage is None:
+        print("❌ ERREUR: stockage du dataset indisponible (cf. --storage)")
+        sys.exit(1)
+
+    manifest = load_manifest(storage)
+    if manifest is None:
+        print(f"❌ ERREUR: pas de manifest dans le namespace {namespace} (lancer seed.py)")
+        sys.exit(1)
+    graph = follow_graph(manifest['users'], manifest['follows'], manifest.get('graph', 'uniform'),
+                         manifest.get('exponent', ZIPF_EXPONENT), manifest['rng_seed'])
+    in_degree = np.bincount(graph.ravel(), minlength=manifest['users'])
+    rng = np.random.default_rng(manifest['rng_seed'])
+
+    targets = {}
+    for bucket in buckets:
+        candidates = np.flatnonzero((in_degree >= bucket) & (in_degree < 2 * bucket))
+        pairs = []
+        # Le graphe recalculé peut différer des follows écrits (seed étendu) :
+        # un candidat hors palier d'après Datastore est remplacé par le suivant
+        for author in rng.permutation(candidates)[:WRITE_CANDIDATES * per_bucket]:
+            followers = storage.followers(f"user{author + 1}")
+            if bucket <= len(followers) < 2 * bucket:
+                follower = followers[rng.integers(len(followers))]
+                pairs.append((int(author) + 1, int(follower.removeprefix("user"))))
+                if len(pairs) == per_bucket:
+                    break
+        if pairs:
+            targets[bucket] = pairs
+        else:
+            print(f"  ⚠️  Aucun auteur avec {bucket}-{2 * bucket - 1} followers dans {namespace}")
+    return targets
+
+
+def test_write(url: str, output_dir: str, prefix: str = "user",
+               options: argparse.Namespace = None):
+    """
+    Publication par des auteurs de plus en plus suivis : PARAM est le palier
+    de nb de followers. write.csv donne la latence et le débit de
+    /api/post, visibility.csv le délai avant que le post soit visible dans
+    la timeline d'un follower.
+    """
+    print("\n" + "=" * 60)
+    print("TEST ÉCRITURE")
+    print("=" * 60)
+
+    targets = write_targets(options.dataset_storage, options.namespace)
+    writes, visibility = [], []
+
+    for bucket, pairs in targets.items():
+        print(f"\n--- {bucket}+ followers ({len(pairs)} auteurs) ---")
+        run_options = argparse.Namespace(**{
+            **vars(options), "write_targets": ",".join(f"{a}:{f}" for a, f in pairs)})
+
+        for run in range(1, NB_RUNS + 1):
+            print(f"  Run {run}/{NB_RUNS}:", end=" ", flush=True)
+
+            metrics = run_load(url, CONCURRENCE_FIXE, TEST_DURATION, run_options)
+            by_name = metrics.get("requetes_par_nom", {})
+            for name, test, rows in (("/api/post", "write", writes),
+                                     ("/api/post [visibility]", "visibility", visibility)):
+                if name in by_name:
+                    by_name[name]["hist"].save(hist_path(output_dir, test, bucket, run))
+                    # La série du run (publications et sondages) accompagne la ligne write
+                    record_run(rows, test, bucket, run, by_name[name], options,
+                               series=metrics.get("series") if test == "write" else None)
+                    print(f"    {test}: p50={by_name[name]['p50']}ms, p99={by_name[name]['p99']}ms, "
+                          f"{by_name[name]['rps']} req/s, Échecs={by_name[name]['echecs']}")
+
+    write_csv(writes, os.path.join(output_dir, "write.csv"))
+    write_csv(visibility, os.path.join(output_dir, "visibility.csv"))
+    return writes, visibility
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
 
+def worker_count(value: str) -> int:
+    """Valeur de --workers : un entier, ou `auto` pour un worker par cœur."""
+    return os.cpu_count() or 1 if value == "auto" else int(value)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Benchmark TinyInsta avec Locust")
     parser.add_argument("--url", required=True, help="URL de l'app")
-    parser.add_argument("--test", choices=["conc", "post", "fanout", "all"], default="all")
+    parser.add_argument("--test", choices=["conc", "post", "fanout", "scroll", "write", "capacity",
+                                           "all"],
+                        default="all")
     parser.add_argument("--output", default="out", help="Dossier de sortie")
     parser.add_argument("--posts", type=int, help="Nb posts/user (pour test post)")
     parser.add_argument("--followers", type=int, help="Nb followers (pour test fanout)")
     parser.add_argument("--prefix", default="user", help="Préfixe des users")
+    parser.add_argument("--namespace", help="Namespace Datastore du dataset ciblé")
+    add_storage_arguments(parser)
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="Boucle fermée (users Locust) ou ouverte (débit d'arrivée fixe)")
+    parser.add_argument("--engine", choices=["locust", "async"], default="locust",
+                        help="Moteur de charge en boucle fermée (default: locust)")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help=f"Profil de charge Locust (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--dataset-users", type=int,
+                        help=f"Nb de users du seed ciblé (default: manifest du namespace, sinon {NB_USERS})")
+    parser.add_argument("--zipf", type=float, default=ZIPF_EXPONENT,
+                        help=f"Exposant de popularité des users, 0 = uniforme (default: {ZIPF_EXPONENT})")
+    parser.add_argument("--rate", type=float, default=RATE_FIXE,
+                        help=f"Débit cible en req/s en boucle ouverte (default: {RATE_FIXE})")
+    parser.add_argument("--pages", type=int, default=SCROLL_DEPTH,
+                        help=f"Profondeur de défilement en pages (test scroll, default: {SCROLL_DEPTH})")
+    
+    parser.add_argument("--slo-p99", type=float, default=SLO_P99,
+                        help=f"SLO de p99 en ms (test capacity, default: {SLO_P99})")
+    parser.add_argument("--tolerance", type=float, default=CAPACITY_TOLERANCE,
+                        help=f"Précision relative de la recherche (test capacity, default: {CAPACITY_TOLERANCE})")
+    parser.add_argument("--probe-duration", type=int, default=PROBE_DURATION,
+                        help=f"Durée d'une sonde en s (test capacity, default: {PROBE_DURATION})")
+    parser.add_argument("--max-load", type=int, default=CAPACITY_MAX_LOAD,
+                        help=f"Charge max explorée (test capacity, default: {CAPACITY_MAX_LOAD})")
+    parser.add_argument("--workers", type=worker_count, default=0,
+                        help="Processus workers Locust (0 = un seul processus, auto = un par cœur)")
+    parser.add_argument("--fixed-duration", action="store_true",
+                        help="Runs Locust de durée fixe, sans échauffement ni arrêt adaptatif")
+    parser.add_argument("--db", default=RESULTS_DB,
+                        help=f"Base SQLite où enregistrer les runs, vide pour désactiver (default: {RESULTS_DB})")
+    parser.add_argument("--label", help="Label des runs dans la base (default: SHA court du commit)")
+    parser.set_defaults(write_targets="")
     
     args = parser.parse_args()
+    if args.test in ("scroll", "write"):
+        args.profile = args.test
     
     os.makedirs(args.output, exist_ok=True)
     
@@ -221,25 +1124,45 @@ def main():
     print("BENCHMARK TINYINSTA")
     print(f"URL: {args.url}")
     print(f"Test: {args.test}")
-    print("=" * 60)
-    
-    # Vérifier locustfile.py
-    if not os.path.exists("locustfile.py"):
-        print("\n❌ ERREUR: locustfile.py introuvable!")
+    if args.namespace:
+        print(f"Namespace: {args.namespace}")
+    if args.mode == "open":
+        print(f"Mode: boucle ouverte ({args.rate} req/s)")
+    else:
+        print(f"Moteur: {args.engine}")
+    args.dataset_storage = dataset_storage(args)
+    args.dataset = dataset_manifest(args.dataset_storage)
+    if args.dataset_users is None:
+        args.dataset_users = args.dataset['users'] if args.dataset else NB_USERS
+    print(f"Profil: {args.profile} ({args.dataset_users} users, zipf={args.zipf})")
+    if args.profile != DEFAULT_PROFILE and (args.mode == "open" or args.engine != "locust"):
+        print(f"❌ ERREUR: le profil {args.profile} n'est disponible qu'avec le moteur locust "
+              "en boucle fermée")
         sys.exit(1)
+    args.store = ResultStore(args.db) if args.db else None
+    if args.store is not None:
+        args.context = run_context(args)
+        print(f"Résultats: {args.db} (label {args.context['label']})")
+    print("=" * 60)
     
     if args.test == "conc":
-        test_conc(args.url, args.output, args.prefix)
+        test_conc(args.url, args.output, args.prefix, args)
     elif args.test == "post":
         if not args.posts:
             print("❌ ERREUR: --posts requis")
             sys.exit(1)
-        test_post_single(args.url, args.output, args.posts, args.prefix)
+        test_post_single(args.url, args.output, args.posts, args.prefix, args)
     elif args.test == "fanout":
         if not args.followers:
             print("❌ ERREUR: --followers requis")
             sys.exit(1)
-        test_fanout_single(args.url, args.output, args.followers, args.prefix)
+        test_fanout_single(args.url, args.output, args.followers, args.prefix, args)
+    elif args.test == "scroll":
+        test_scroll(args.url, args.output, args.prefix, args)
+    elif args.test == "write":
+        test_write(args.url, args.output, args.prefix, args)
+    elif args.test == "capacity":
+        test_capacity(args.url, args.output, args.prefix, args)
     elif args.test == "all":
         print("\nPour lancer tous les tests, utilisez: snakemake -j1")
         sys.exit(1)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Cache des pages de timeline de l'app TinyInsta (main.py).
+
+Une entrée par (namespace, user) regroupe les pages déjà calculées de ce user
+(clé de page : limit + curseur) ; invalider un user efface toutes ses pages.
+Le backend est choisi par la variable d'environnement TIMELINE_CACHE :
+
+- `none`             : pas de cache ;
+- `memory`           : dictionnaire LRU + TTL dans le processus (une instance F1) ;
+- `redis://host:port/db` : Redis partagé entre instances (TTL par entrée ;
+                        la borne mémoire et l'éviction LRU relèvent du serveur,
+                        à configurer en `maxmemory` + `maxmemory-policy allkeys-lru`).
+
+Les compteurs (hits, misses, evictions, invalidations) sont exposés par
+`GET /api/cache/stats` pour que benchmark.py les rapporte avec les latences.
+"""
+
+from collections import Counter, OrderedDict
+import json
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_TTL = 5          # Durée de vie d'une page en cache (s)
+CACHE_SIZE = 10000     # Nb max de users en cache (backend memory)
+STATS = ('hits', 'misses', 'evictions', 'invalidations')
+
+
+class NullCache:
+    """Backend sans cache : toutes les lectures sont des misses."""
+
+    name = 'none'
+
+    def __init__(self):
+        self.counters = dict.fromkeys(STATS, 0)
+
+    def get(self, namespace: str, user: str, page: str):
+        self.counters['misses'] += 1
+        return None
+
+    def set(self, namespace: str, user: str, page: str, value):
+        pass
+
+    def invalidate(self, namespace: str, users: list):
+        pass
+
+    def stats(self) -> dict:
+        return {'backend': self.name, 'size': 0, **self.counters}
+
+
+class MemoryCache:
+    """Cache LRU + TTL dans le processus, protégé par un verrou."""
+
+    name = 'memory'
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()   # (namespace, user) -> (expire, {page: value})
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(STATS, 0)
+
+    def get(self, namespace: str, user: str, page: str):
+        key = (namespace, user)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                self.counters['evictions'] += 1
+                entry = None
+            if entry is None or page not in entry[1]:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[1][page]
+
+    def set(self, namespace: str, user: str, page: str, value):
+        key = (namespace, user)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                entry = (time.monotonic() + self.ttl, {})
+                self.entries[key] = entry
+            entry[1][page] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def invalidate(self, namespace: str, users: list):
+        with self.lock:
+            for user in users:
+                if self.entries.pop((namespace, user), None) is not None:
+                    self.counters['invalidations'] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'backend': self.name, 'size': len(self.entries), **self.counters}
+
+
+class RedisCache:
+    """
+    Cache partagé entre instances : un hash Redis par user, TTL sur le hash.
+
+    Les compteurs vont dans le hash `timeline:stats`. Pour ne pas ajouter un
+    aller-retour Redis à chaque lecture, l'issue d'une lecture est comptée
+    localement et envoyée avec la requête suivante du processus au cache
+    (lecture, écriture ou stats()) : seules manquent les lectures qui suivent
+    la dernière requête de chaque processus. Les
+    évictions comptées sont celles de ce cache (page périmée trouvée à la
+    lecture) ; celles du serveur (maxmemory, toutes clés) sont rapportées à
+    part sous `server_evictions`.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str, ttl: float = CACHE_TTL):
+        if redis is None:
+            raise RuntimeError("redis non installé! Installez: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.pending = Counter()   # Compteurs pas encore envoyés à Redis
+        self.lock = threading.Lock()
+
+    def key(self, namespace: str, user: str) -> str:
+        return f"timeline:{namespace or ''}:{user}"
+
+    def flush(self, pipe):
+        """Ajoute au pipeline l'envoi des compteurs locaux."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        for stat, count in pending.items():
+            pipe.hincrby('timeline:stats', stat, count)
+
+    def get(self, namespace: str, user: str, page: str):
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.hget(self.key(namespace, user), page)
+            self.flush(pipe)
+            value = pipe.execute()[0]
+        stale = False
+        if value is not None:
+            expire, value = json.loads(value)
+            stale = expire < time.time()
+            if stale:
+                value = None
+        with self.lock:
+            self.pending['misses' if value is None else 'hits'] += 1
+            if stale:
+                self.pending['evictions'] += 1
+        return value
+
+    def set(self, namespace: str, user: str, page: str, value):
+        # L'échéance est stockée avec la page : le TTL du hash ne sert qu'au ménage
+        key = self.key(namespace, user)
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, page, json.dumps([time.time() + self.ttl, value]))
+            pipe.expire(key, max(1, round(self.ttl)))
+            self.flush(pipe)
+            pipe.execute()
+
+    def invalidate(self, namespace: str, users: list):
+        if users:
+            deleted = self.client.delete(*(self.key(namespace, u) for u in users))
+            with self.lock:
+                self.pending['invalidations'] += deleted
+
+    def stats(self) -> dict:
+        with self.client.pipeline(transaction=False) as pipe:
+            self.flush(pipe)
+            pipe.hgetall('timeline:stats')
+            pipe.info('stats')
+            pipe.dbsize()
+            *_, counters, info, size = pipe.execute()
+        return {'backend': self.name, 'size': size,
+                **{s: int(counters.get(s.encode(), 0)) for s in STATS},
+                'server_evictions': info.get('evicted_keys', 0)}
+
+
+def make_cache(spec: str, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+    """Instancie le backend décrit par `spec` ('none', 'memory' ou une URL redis://)."""
+    if not spec or spec == 'none':
+        return NullCache()
+    if spec == 'memory':
+        return MemoryCache(size, ttl)
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(spec, ttl)
+    raise ValueError(f"Backend de cache inconnu: {spec} (choix: none, memory, redis://...)")
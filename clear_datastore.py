@@ -1,78 +1,121 @@
 #!/usr/bin/env python3
 """
-Script pour vider le Datastore (User et Post) entre chaque configuration.
+Script pour vider le Datastore (User, Post et timelines matérialisées)
+entre chaque configuration.
 
 Usage:
-    python clear_datastore.py                    # Vide User et Post
+    python clear_datastore.py                    # Vide User, Post, Timeline et le manifest
     python clear_datastore.py --kind Post        # Vide seulement Post
     python clear_datastore.py --kind User        # Vide seulement User
+    python clear_datastore.py --kind Timeline    # Vide seulement les timelines (stratégie push)
     python clear_datastore.py --dry-run          # Affiche sans supprimer
+    python clear_datastore.py --workers 16       # 16 suppressions en parallèle
+    python clear_datastore.py --namespace post10 # Supprime le dataset d'un namespace
+    python clear_datastore.py --storage emulator # Vide l'émulateur local (cf. storage.py)
 """
 
-from google.cloud import datastore
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import argparse
 import time
-import os
-os.environ['GOOGLE_CLOUD_PROJECT'] = 'tinyinsta-480307'
 
-def delete_all_entities(client: datastore.Client, kind: str, batch_size: int = 500, dry_run: bool = False):
-    """Supprime toutes les entités d'un kind donné par batches."""
+from seed import MANIFEST_KIND, MANIFEST_NAME
+from storage import add_storage_arguments, make_storage
+
+NB_WORKERS = 8
+# Kinds du dataset ; Timeline (timeline.TIMELINE_KIND) est écrit par la stratégie push
+KINDS = ['User', 'Post', 'Timeline']
+
+
+def iter_key_batches(storage, kind: str, batch_size: int):
+    """
+    Parcourt toutes les clés d'un kind avec une seule requête keys-only
+    (pagination par curseur) et les regroupe par batches de `batch_size`.
+    """
+    batch = []
+    for key in storage.keys(kind):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def delete_all_entities(storage, kind: str, batch_size: int = 500,
+                        dry_run: bool = False, workers: int = NB_WORKERS):
+    """
+    Supprime toutes les entités d'un kind : les clés sont lues en streaming
+    par curseur et `workers` delete_multi restent en vol en parallèle.
+    `storage` est un backend de storage.py.
+    """
+    if dry_run:
+        count = storage.count(kind)
+        print(f"  [DRY-RUN] Supprimeraient {count} entités {kind}")
+        return count
+
     total_deleted = 0
-    
-    while True:
-        # Récupérer un batch de clés
-        query = client.query(kind=kind)
-        query.keys_only()
-        keys = list(query.fetch(limit=batch_size))
-        
-        if not keys:
-            break
-        
-        if dry_run:
-            print(f"  [DRY-RUN] Supprimeraient {len(keys)} entités {kind}")
-            total_deleted += len(keys)
-            # En dry-run, on ne peut pas continuer la boucle car rien n'est supprimé
-            # On compte juste le premier batch
-            query2 = client.query(kind=kind)
-            query2.keys_only()
-            all_keys = list(query2.fetch())
-            return len(all_keys)
-        else:
-            client.delete_multi(keys)
-            total_deleted += len(keys)
-            print(f"  Supprimé {total_deleted} entités {kind}...")
-            time.sleep(0.1)  # Petit délai pour ne pas surcharger
-    
+    max_inflight = workers * 2
+    inflight = {}
+
+    def collect(done):
+        nonlocal total_deleted
+        for fut in done:
+            size = inflight.pop(fut)
+            fut.result()
+            total_deleted += size
+        print(f"  Supprimé {total_deleted} entités {kind}...")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for keys in iter_key_batches(storage, kind, batch_size):
+            if len(inflight) >= max_inflight:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                collect(done)
+            inflight[executor.submit(storage.delete_multi, keys)] = len(keys)
+        while inflight:
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            collect(done)
+
     return total_deleted
 
 
 def main():
     parser = argparse.ArgumentParser(description="Vide le Datastore")
-    parser.add_argument('--kind', choices=['User', 'Post', 'all'], default='all',
+    parser.add_argument('--kind', choices=KINDS + ['all'], default='all',
                         help="Kind à supprimer (default: all)")
     parser.add_argument('--dry-run', action='store_true',
                         help="Affiche ce qui serait supprimé sans supprimer")
     parser.add_argument('--batch-size', type=int, default=500,
                         help="Taille des batches de suppression (default: 500)")
+    parser.add_argument('--workers', type=int, default=NB_WORKERS,
+                        help=f"Nb de suppressions en parallèle (default: {NB_WORKERS})")
+    parser.add_argument('--namespace', help="Namespace Datastore à vider (default: aucun)")
+    add_storage_arguments(parser)
     args = parser.parse_args()
-    
-    client = datastore.Client()
-    
+
+    storage = make_storage(args.storage, args.namespace, args.rpc_latency, args.entity_latency)
+
     print("=" * 60)
     print("NETTOYAGE DATASTORE")
+    if args.namespace:
+        print(f"Namespace: {args.namespace}")
     if args.dry_run:
         print("[MODE DRY-RUN - Aucune suppression]")
     print("=" * 60)
-    
-    kinds_to_delete = ['User', 'Post'] if args.kind == 'all' else [args.kind]
-    
+
+    kinds_to_delete = KINDS if args.kind == 'all' else [args.kind]
+
     for kind in kinds_to_delete:
         print(f"\nSuppression de toutes les entités '{kind}'...")
         start = time.time()
-        count = delete_all_entities(client, kind, args.batch_size, args.dry_run)
+        count = delete_all_entities(storage, kind, args.batch_size, args.dry_run, args.workers)
         elapsed = time.time() - start
         print(f"  -> {count} entités '{kind}' supprimées en {elapsed:.1f}s")
-    
+
+    # Le manifest ne décrit plus le dataset dès qu'un kind a été vidé
+    if not args.dry_run:
+        storage.delete(storage.key(MANIFEST_KIND, MANIFEST_NAME))
+        print(f"\nManifest '{MANIFEST_KIND}/{MANIFEST_NAME}' supprimé")
+
     print("\n" + "=" * 60)
     print("NETTOYAGE TERMINÉ")
     print("=" * 60)
@@ -7,15 +7,43 @@ Usage:
     python generate_plots.py --only conc        # Seulement conc.png
     python generate_plots.py --only post        # Seulement post.png
     python generate_plots.py --only fanout      # Seulement fanout.png
+    python generate_plots.py --only scroll      # Seulement scroll.png
+    python generate_plots.py --only write       # write.png et visibility.png
+    python generate_plots.py --db results.db --label 3f2a9c1e0b --output out/3f2a9c1e0b
+
+Si les histogrammes de latences des runs (hist/*.hdr) sont présents, les
+barres montrent les percentiles agrégés sur tous les runs d'une configuration
+et une courbe CDF ({test}_cdf.png) est générée ; sinon moyenne ± écart-type
+des runs à partir du CSV. Si les séries par seconde des runs (series/*.tis)
+sont présentes, {test}_series.png trace latence et débit au cours de chaque
+run, une ligne de graphiques par PARAM. Si l'app a renvoyé des en-têtes
+Server-Timing (server/*.hdr, ou colonnes SERVER_* avec --db),
+{test}_server.png décompose p50 et p99 par phase à côté de la latence de
+bout en bout.
+
+Avec --db, les runs sont lus dans la base de résultats de benchmark.py
+(cf. results.py) au lieu des CSV : ceux du label --label, par défaut le
+dernier enregistré.
 """
 
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import glob
 import os
+import re
 import sys
 
+from histogram import LatencyHistogram
+from results import ResultStore
+from timeseries import SeriesData
+
+PERCENTILES_PLOT = [50, 90, 99]
+# Phases Server-Timing de /api/timeline (cf. locustfile.SERVER_PHASES), "rpc" : nb de RPC Datastore
+PHASES_SERVEUR = ["app", "cache", "follows", "queries", "merge", "serialize", "rpc"]
+PERCENTILES_SERVEUR = [50, 99]
+
 
 def parse_temps(valeur):
     """Convertit '123.45ms' en float en secondes (0.12345)"""
@@ -38,6 +66,11 @@ def creer_barplot(csv_path: str, output_path: str, titre: str, label_x: str):
         print(f"Fichier vide: {csv_path}")
         return False
     
+    return tracer_barplot(df, output_path, titre, label_x)
+
+
+def tracer_barplot(df: pd.DataFrame, output_path: str, titre: str, label_x: str):
+    """Barplot moyenne ± écart-type des runs par PARAM (colonnes PARAM et AVG_TIME)."""
     df['TEMPS_MS'] = df['AVG_TIME'].apply(parse_temps)
     
     # Moyenne et écart-type par PARAM
@@ -100,67 +133,324 @@ def creer_barplot(csv_path: str, output_path: str, titre: str, label_x: str):
     return True
 
 
+def charger_histogrammes(input_dir: str, test: str) -> dict:
+    """Fusionne les histogrammes de tous les runs, par PARAM : {param: histogramme}."""
+    motif = os.path.join(input_dir, "**", "hist", f"{test}_*_run*.hdr")
+    hists = {}
+    for path in glob.glob(motif, recursive=True):
+        match = re.match(rf"{test}_(\d+)_run\d+\.hdr$", os.path.basename(path))
+        if match:
+            param = int(match.group(1))
+            hists.setdefault(param, LatencyHistogram()).merge(LatencyHistogram.load(path))
+    return dict(sorted(hists.items()))
+
+
+def creer_barplot_percentiles(hists: dict, output_path: str, titre: str, label_x: str):
+    """Crée un barplot des percentiles agrégés (tous runs confondus) par PARAM."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    x = np.arange(len(hists))
+    largeur = 0.8 / len(PERCENTILES_PLOT)
+    couleurs = ['#4285F4', '#FBBC05', '#EA4335']
+
+    for k, (p, couleur) in enumerate(zip(PERCENTILES_PLOT, couleurs)):
+        valeurs = [h.percentile(p) / 1000.0 for h in hists.values()]  # ms -> s
+        barres = ax.bar(x + (k - 1) * largeur, valeurs, largeur, label=f"p{p}",
+                        color=couleur, edgecolor='black', linewidth=1.2)
+        for barre, v in zip(barres, valeurs):
+            ax.annotate(f'{v:.2f}s', xy=(barre.get_x() + barre.get_width() / 2, barre.get_height()),
+                        ha='center', va='bottom', fontsize=8)
+
+    ax.set_xlabel(label_x, fontsize=12, fontweight='bold')
+    ax.set_ylabel('Latence par requête (s)', fontsize=12, fontweight='bold')
+    ax.set_title(titre, fontsize=14, fontweight='bold', pad=20)
+
+    ax.set_xticks(x)
+    ax.set_xticklabels([str(p) for p in hists], fontsize=11)
+    ax.legend()
+
+    ax.yaxis.grid(True, linestyle='--', alpha=0.7)
+    ax.set_axisbelow(True)
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+    print(f"Graphique créé: {output_path}")
+    return True
+
+
+def creer_cdf(hists: dict, output_path: str, titre: str, label_param: str):
+    """Trace la fonction de répartition des latences de chaque PARAM."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    for param, hist in hists.items():
+        points = hist.cdf()
+        ax.step([v / 1000.0 for v, _ in points], [f for _, f in points], where='post',
+                label=f"{label_param} = {param} ({hist.total} req.)")
+
+    ax.set_xscale('log')
+    ax.set_xlabel('Latence par requête (s)', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Fraction des requêtes', fontsize=12, fontweight='bold')
+    ax.set_title(titre, fontsize=14, fontweight='bold', pad=20)
+    ax.grid(True, which='both', linestyle='--', alpha=0.5)
+    ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+    print(f"Graphique créé: {output_path}")
+    return True
+
+
+def charger_series(input_dir: str, test: str) -> dict:
+    """Séries par seconde des runs, par PARAM : {param: {run: série}}."""
+    motif = os.path.join(input_dir, "**", "series", f"{test}_*_run*.tis")
+    series = {}
+    for path in glob.glob(motif, recursive=True):
+        match = re.match(rf"{test}_(\d+)_run(\d+)\.tis$", os.path.basename(path))
+        if match:
+            series.setdefault(int(match.group(1)), {})[int(match.group(2))] = SeriesData.load(path)
+    return dict(sorted(series.items()))
+
+
+def creer_series(series: dict, output_path: str, titre: str, label_param: str):
+    """
+    Latence (p50 plein, p99 pointillé) et débit (avec les users en vol, axe de
+    droite) seconde par seconde, une couleur par run ; les secondes avec
+    échecs sont marquées d'une croix et la fin de l'échauffement d'un trait vertical.
+    """
+    fig, axes = plt.subplots(len(series), 2, figsize=(14, 3.5 * len(series)), squeeze=False)
+    couleurs = plt.rcParams['axes.prop_cycle'].by_key()['color']
+
+    for ligne, (param, runs) in zip(axes, series.items()):
+        ax_lat, ax_rps = ligne
+        ax_vol = ax_rps.twinx()
+        for k, (run, data) in enumerate(sorted(runs.items())):
+            couleur = couleurs[k % len(couleurs)]
+            t = np.arange(len(data))
+            c = data.columns
+            ax_lat.plot(t, np.array(c['p50']) / 1000.0, color=couleur, label=f"run {run} p50")
+            ax_lat.plot(t, np.array(c['p99']) / 1000.0, color=couleur, linestyle='--',
+                        label=f"run {run} p99")
+            ax_rps.plot(t, c['requests'], color=couleur, label=f"run {run}")
+            ax_vol.plot(t, c['inflight'], color=couleur, linestyle=':', alpha=0.6)
+            echecs = [s for s in t if c['errors'][s]]
+            ax_rps.scatter(echecs, [c['requests'][s] for s in echecs], color=couleur, marker='x')
+            if data.warmup is not None:
+                for ax in (ax_lat, ax_rps):
+                    ax.axvline(data.warmup, color=couleur, linestyle='-.', alpha=0.5)
+
+        ax_lat.set_title(f"{label_param} = {param} : latence", fontsize=11, fontweight='bold')
+        ax_lat.set_ylabel('Latence (s)')
+        ax_rps.set_title(f"{label_param} = {param} : débit", fontsize=11, fontweight='bold')
+        ax_rps.set_ylabel('Requêtes/s')
+        ax_vol.set_ylabel('En vol (pointillés)')
+        for ax in (ax_lat, ax_rps):
+            ax.set_xlabel('Temps depuis le début du run (s)')
+            ax.grid(True, linestyle='--', alpha=0.5)
+        ax_lat.legend(fontsize=7, ncol=2)
+
+    fig.suptitle(titre, fontsize=14, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=120, bbox_inches='tight')
+    plt.close()
+
+    print(f"Graphique créé: {output_path}")
+    return True
+
+
+def charger_phases(input_dir: str, test: str) -> dict:
+    """
+    p50/p99 des phases Server-Timing et de la latence de bout en bout
+    ("client"), histogrammes des runs fusionnés : {param: {phase: {p: ms}}}.
+    """
+    motif = os.path.join(input_dir, "**", "server", f"{test}_*_run*_*.hdr")
+    hists = {}
+    for path in glob.glob(motif, recursive=True):
+        match = re.match(rf"{test}_(\d+)_run\d+_([\w-]+)\.hdr$", os.path.basename(path))
+        if match:
+            phases = hists.setdefault(int(match.group(1)), {})
+            phases.setdefault(match.group(2), LatencyHistogram()).merge(LatencyHistogram.load(path))
+    for param, hist in charger_histogrammes(input_dir, test).items():
+        if param in hists:
+            hists[param]["client"] = hist
+    return {param: {phase: {p: h.percentile(p) for p in PERCENTILES_SERVEUR}
+                    for phase, h in phases.items()}
+            for param, phases in sorted(hists.items())}
+
+
+def phases_des_lignes(rows: list) -> dict:
+    """Comme charger_phases, à partir des colonnes des lignes de la base (moyenne des runs)."""
+    if not rows:
+        return {}
+    df = pd.DataFrame(rows)
+    phases = {}
+    for param, groupe in df.groupby('PARAM'):
+        par_phase = {}
+        for phase in PHASES_SERVEUR + ["client"]:
+            colonnes = {p: f"P{p}" if phase == "client" else f"SERVER_{phase.upper()}_P{p}"
+                        for p in PERCENTILES_SERVEUR}
+            if all(c in groupe for c in colonnes.values()):
+                valeurs = {p: pd.to_numeric(groupe[c], errors='coerce').mean()
+                           for p, c in colonnes.items()}
+                if not any(pd.isna(v) for v in valeurs.values()):
+                    par_phase[phase] = valeurs
+        if len(par_phase) > 1:
+            phases[int(param)] = par_phase
+    return dict(sorted(phases.items()))
+
+
+def creer_decomposition(phases: dict, output_path: str, titre: str, label_x: str):
+    """
+    Barres groupées par PARAM : latence de bout en bout ("client") puis
+    durée de chaque phase serveur, un graphique par percentile ; le nb de
+    RPC Datastore au même percentile est indiqué sous chaque PARAM.
+    """
+    noms = ["client"] + [ph for ph in PHASES_SERVEUR if ph != "rpc"
+                         and any(ph in par_phase for par_phase in phases.values())]
+    fig, axes = plt.subplots(1, len(PERCENTILES_SERVEUR), figsize=(14, 6), squeeze=False)
+    couleurs = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    x = np.arange(len(phases))
+    largeur = 0.8 / len(noms)
+
+    for ax, p in zip(axes[0], PERCENTILES_SERVEUR):
+        for k, (nom, couleur) in enumerate(zip(noms, couleurs)):
+            valeurs = [par_phase.get(nom, {}).get(p, 0) for par_phase in phases.values()]
+            ax.bar(x + (k - (len(noms) - 1) / 2) * largeur, valeurs, largeur, label=nom,
+                   color=couleur, edgecolor='black', linewidth=0.8,
+                   hatch='//' if nom == "client" else None)
+        ax.set_xticks(x)
+        ax.set_xticklabels([f"{param}" + (f"\n{par_phase['rpc'][p]:.0f} RPC" if 'rpc' in par_phase else "")
+                            for param, par_phase in phases.items()], fontsize=10)
+        ax.set_xlabel(label_x, fontsize=11, fontweight='bold')
+        ax.set_ylabel('Durée (ms)', fontsize=11, fontweight='bold')
+        ax.set_title(f"p{p}", fontsize=12, fontweight='bold')
+        ax.yaxis.grid(True, linestyle='--', alpha=0.7)
+        ax.set_axisbelow(True)
+    axes[0][0].legend(fontsize=9)
+
+    fig.suptitle(titre, fontsize=14, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+    print(f"Graphique créé: {output_path}")
+    return True
+
+
+def generer_graphiques(test: str, args, titre: str, label_x: str, label_param: str) -> bool:
+    """
+    Percentiles + CDF à partir des histogrammes, ou barplot du CSV à défaut
+    (des lignes enregistrées dans la base avec --db), puis les séries par
+    seconde et la décomposition Server-Timing si elles existent.
+    """
+    ok = generer_barplots(test, args, titre, label_x, label_param)
+    if args.store is not None:
+        series = args.store.series(args.label, test)
+        phases = phases_des_lignes(args.store.rows(args.label, test))
+    else:
+        series = charger_series(args.input, test)
+        phases = charger_phases(args.input, test)
+    if ok and series:
+        ok = creer_series(series, os.path.join(args.output, f"{test}_series.png"),
+                          f"Latence et débit au cours des runs {titre}", label_param)
+    if ok and phases:
+        ok = creer_decomposition(phases, os.path.join(args.output, f"{test}_server.png"),
+                                 f"Latence par phase serveur {titre}", label_x)
+    return ok
+
+
+def generer_barplots(test: str, args, titre: str, label_x: str, label_param: str) -> bool:
+    """Percentiles + CDF à partir des histogrammes, ou barplot des lignes CSV à défaut."""
+    if args.store is not None:
+        hists = args.store.histograms(args.label, test)
+    else:
+        hists = charger_histogrammes(args.input, test)
+    if hists:
+        ok = creer_barplot_percentiles(hists, os.path.join(args.output, f"{test}.png"),
+                                       f"Percentiles de latence {titre}", label_x)
+        return ok and creer_cdf(hists, os.path.join(args.output, f"{test}_cdf.png"),
+                                f"Distribution des latences {titre}", label_param)
+
+    if args.store is not None:
+        rows = args.store.rows(args.label, test)
+        if not rows:
+            print(f"Aucun run {test} pour le label {args.label} dans {args.db}")
+            return False
+        return tracer_barplot(pd.DataFrame(rows), os.path.join(args.output, f"{test}.png"),
+                              f"Temps moyen par requête {titre}", label_x)
+
+    csv_path = os.path.join(args.input, f"{test}.csv")
+    if not os.path.exists(csv_path):
+        print(f"Fichier non trouvé: {csv_path}")
+        return False
+    return creer_barplot(csv_path, os.path.join(args.output, f"{test}.png"),
+                         f"Temps moyen par requête {titre}", label_x)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Génère les graphiques de benchmark")
     parser.add_argument("--input", default="out", help="Dossier des CSV")
     parser.add_argument("--output", default="out", help="Dossier de sortie")
-    parser.add_argument("--only", choices=["conc", "post", "fanout"], 
+    parser.add_argument("--only", choices=["conc", "post", "fanout", "scroll", "write"], 
                         help="Générer un seul graphique")
+    parser.add_argument("--db", help="Base de résultats SQLite à lire au lieu des CSV")
+    parser.add_argument("--label", help="Label des runs à tracer avec --db (default: le dernier)")
     
     args = parser.parse_args()
+    if args.db and not os.path.exists(args.db):
+        print(f"Base non trouvée: {args.db}")
+        sys.exit(1)
+    args.store = ResultStore(args.db) if args.db else None
+    if args.store is not None:
+        args.label = args.label or args.store.latest_label()
+        if args.label is None:
+            print(f"Aucun run dans {args.db}")
+            sys.exit(1)
     
     os.makedirs(args.output, exist_ok=True)
     
     print("=" * 60)
     print("GÉNÉRATION DES GRAPHIQUES")
+    if args.store is not None:
+        print(f"Base: {args.db} (label {args.label})")
     print("=" * 60)
     
     success = True
     
     # Graphique Concurrence
     if args.only is None or args.only == "conc":
-        conc_csv = os.path.join(args.input, "conc.csv")
-        if os.path.exists(conc_csv):
-            ok = creer_barplot(
-                conc_csv,
-                os.path.join(args.output, "conc.png"),
-                "Temps moyen par requête selon la concurrence",
-                "Nombre d'utilisateurs concurrents"
-            )
-            success = success and ok
-        else:
-            print(f"Fichier non trouvé: {conc_csv}")
-            success = False
+        ok = generer_graphiques("conc", args, "selon la concurrence",
+                                "Nombre d'utilisateurs concurrents", "concurrence")
+        success = success and ok
     
     # Graphique Posts
     if args.only is None or args.only == "post":
-        post_csv = os.path.join(args.input, "post.csv")
-        if os.path.exists(post_csv):
-            ok = creer_barplot(
-                post_csv,
-                os.path.join(args.output, "post.png"),
-                "Temps moyen par requête selon le nombre de posts",
-                "Nombre de posts par utilisateur"
-            )
-            success = success and ok
-        else:
-            print(f"Fichier non trouvé: {post_csv}")
-            success = False
+        ok = generer_graphiques("post", args, "selon le nombre de posts",
+                                "Nombre de posts par utilisateur", "posts/user")
+        success = success and ok
     
     # Graphique Fanout
     if args.only is None or args.only == "fanout":
-        fanout_csv = os.path.join(args.input, "fanout.csv")
-        if os.path.exists(fanout_csv):
-            ok = creer_barplot(
-                fanout_csv,
-                os.path.join(args.output, "fanout.png"),
-                "Temps moyen par requête selon le nombre de followers",
-                "Nombre de followers par utilisateur"
-            )
-            success = success and ok
-        else:
-            print(f"Fichier non trouvé: {fanout_csv}")
-            success = False
+        ok = generer_graphiques("fanout", args, "selon le nombre de followers",
+                                "Nombre de followers par utilisateur", "followers")
+        success = success and ok
+    
+    # Graphique Défilement (pas dans les graphiques par défaut : test optionnel)
+    if args.only == "scroll":
+        ok = generer_graphiques("scroll", args, "selon la profondeur de page",
+                                "Page de la timeline", "page")
+        success = success and ok
+    
+    # Graphiques Écriture : latence de publication et délai de visibilité (test optionnel)
+    if args.only == "write":
+        ok = generer_graphiques("write", args, "de publication selon le nb de followers",
+                                "Nombre de followers de l'auteur (palier)", "followers")
+        ok = ok and generer_graphiques("visibility", args, "de visibilité selon le nb de followers",
+                                       "Nombre de followers de l'auteur (palier)", "followers")
+        success = success and ok
     
     print("\n" + "=" * 60)
     if success:
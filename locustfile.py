@@ -1,30 +1,328 @@
 #!/usr/bin/env python3
 """
 Locustfile pour TinyInsta - Teste des timelines différentes par utilisateur.
+
+Le profil de charge (--workload) pondère les tâches : lecture de timeline,
+défilement profond (pages suivantes via le curseur), publication et
+follow/unfollow. Les users sont tirés selon une popularité de Zipf
+(--zipf, 0 = uniforme) parmi les --dataset-users users du seed (par
+défaut ceux du manifest écrit par seed.py dans le namespace ciblé).
+
+Le profil `write` publie au nom des auteurs de --write-targets
+("auteur:follower,..." en ids de users) et mesure le délai de visibilité :
+la timeline du follower est interrogée jusqu'à ce que le post y apparaisse,
+et le délai depuis la publication est rapporté comme une requête
+"/api/post [visibility]" (type VISIBLE).
+
+L'en-tête Server-Timing de chaque /api/timeline (cf. main.py), pages du
+défilement comprises, est rapporté phase par phase comme des requêtes "/api/timeline [server PHASE]" (type
+SERVER) : leur histogramme donne les percentiles côté serveur de chaque
+phase. "/api/timeline [server rpc]" porte le nb de RPC Datastore de la
+requête à la place d'une durée.
+
+Lancé en worker (`--worker`, cf. benchmark.py --workers), chaque processus
+cumule un histogramme de latences par requête et l'envoie au master avec
+chaque rapport de stats.
 """
 
-from locust import HttpUser, task, between
+from locust import HttpUser, between, events
+from locust.runners import WorkerRunner
+from itertools import accumulate
+import locust.runners
+import gevent
 import random
+import re
+import time
+
+from histogram import LatencyHistogram
+from storage import DEFAULT_STORAGE, STORAGES, make_storage
+
+# Pause entre deux requêtes d'un user (partagée avec le moteur asyncio)
+WAIT_MIN, WAIT_MAX = 0.1, 0.5
+
+NB_USERS = 1000
+ZIPF_EXPONENT = 1.0
+SCROLL_PAGES = 5
+
+# Délai de visibilité : intervalle de sondage et abandon (s)
+VISIBILITY_POLL = 0.1
+VISIBILITY_TIMEOUT = 30
+
+# Période des rapports worker -> master (s, 3 par défaut dans Locust)
+WORKER_REPORT_INTERVAL = 1.0
+
+# Phases de l'en-tête Server-Timing de /api/timeline (main.py), `app` pour le total serveur
+SERVER_PHASES = ["app", "cache", "follows", "queries", "merge", "serialize"]
+SERVER_TIMING_TYPE = "SERVER"
+SERVER_METRIC = re.compile(r'([\w-]+)(?:;dur=([\d.]+))?(?:;desc="?rpc=(\d+)"?)?')
+
+# Profil -> poids des tâches (noms des méthodes de TinyInstaUser)
+PROFILES = {
+    "read": {"get_timeline": 1},
+    "mixed": {"get_timeline": 80, "scroll_timeline": 10, "create_post": 7, "toggle_follow": 3},
+    "social": {"get_timeline": 50, "scroll_timeline": 10, "create_post": 25, "toggle_follow": 15},
+    "scroll": {"scroll_timeline": 1},
+    "write": {"publish": 1},
+}
+DEFAULT_PROFILE = "read"
+
+
+def timeline_url(user_id: int, namespace: str = "", limit: int = 20, cursor: str = None) -> str:
+    """Chemin de la timeline d'un user (partagé avec les autres moteurs de benchmark.py)."""
+    ns_param = f"&namespace={namespace}" if namespace else ""
+    cursor_param = f"&cursor={cursor}" if cursor else ""
+    return f"/api/timeline?user=user{user_id}&limit={limit}{ns_param}{cursor_param}"
+
+
+def server_timing_name(phase: str) -> str:
+    """Nom de requête sous lequel est rapportée une phase Server-Timing (ou "rpc")."""
+    return f"/api/timeline [server {phase}]"
+
+
+def parse_server_timing(header: str) -> tuple:
+    """({phase: durée ms}, nb total de RPC) d'un en-tête Server-Timing."""
+    durations, rpcs = {}, 0
+    for metric in filter(None, (m.strip() for m in header.split(","))):
+        match = SERVER_METRIC.match(metric)
+        if match is None:
+            continue
+        name, duration, count = match.groups()
+        if duration is not None:
+            durations[name] = float(duration)
+        rpcs += int(count or 0)
+    return durations, rpcs
+
+
+class UserSampler:
+    """Tire des ids de users selon une loi de Zipf (user1 le plus populaire)."""
+
+    def __init__(self, nb_users: int = NB_USERS, exponent: float = ZIPF_EXPONENT):
+        self.ids = range(1, nb_users + 1)
+        self.cum_weights = list(accumulate(1 / i ** exponent for i in self.ids))
+
+    def sample(self) -> int:
+        return random.choices(self.ids, cum_weights=self.cum_weights)[0]
+
+
+def manifest_users(namespace: str, storage: str = DEFAULT_STORAGE) -> int:
+    """Nb de users du manifest écrit par seed.py, NB_USERS s'il est absent ou illisible."""
+    try:
+        from seed import load_manifest
+        manifest = load_manifest(make_storage(storage, namespace or None))
+    except Exception:  # Dépendances, identifiants ou réseau absents
+        manifest = None
+    return manifest['users'] if manifest else NB_USERS
+
+
+@events.init_command_line_parser.add_listener
+def _(parser):
+    parser.add_argument("--namespace", type=str, env_var="TINYINSTA_NAMESPACE", default="",
+                        help="Namespace Datastore du dataset ciblé (passé à l'app)")
+    parser.add_argument("--storage", choices=list(STORAGES), default=DEFAULT_STORAGE,
+                        env_var="TINYINSTA_STORAGE", help="Backend de stockage du manifest du dataset")
+    parser.add_argument("--workload", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        env_var="TINYINSTA_WORKLOAD", help="Profil de charge")
+    parser.add_argument("--dataset-users", type=int, default=None,
+                        env_var="TINYINSTA_DATASET_USERS",
+                        help=f"Nb de users du seed (default: manifest du namespace, sinon {NB_USERS})")
+    parser.add_argument("--zipf", type=float, default=ZIPF_EXPONENT, env_var="TINYINSTA_ZIPF",
+                        help="Exposant de popularité des users (0 = uniforme)")
+    parser.add_argument("--scroll-pages", type=int, default=SCROLL_PAGES,
+                        env_var="TINYINSTA_SCROLL_PAGES", help="Pages lues par défilement")
+    parser.add_argument("--write-targets", type=str, default="", env_var="TINYINSTA_WRITE_TARGETS",
+                        help="Couples auteur:follower (ids) du profil write")
+
+
+@events.init.add_listener
+def _(environment, **kwargs):
+    """Locust en ligne de commande : applique le profil choisi à TinyInstaUser."""
+    options = environment.parsed_options
+    if options is not None:
+        TinyInstaUser.tasks = profile_tasks(options.workload)
+        if options.dataset_users is None:
+            options.dataset_users = manifest_users(options.namespace, options.storage)
+    if isinstance(environment.runner, WorkerRunner):
+        locust.runners.WORKER_REPORT_INTERVAL = WORKER_REPORT_INTERVAL
+        ship_histograms(environment)
+
+
+def ship_histograms(environment):
+    """
+    Côté worker : cumule par nom de requête [type, nb, somme des latences,
+    histogramme, nb d'échecs] et l'ajoute au rapport suivant (clé "tinyinsta_hists").
+    """
+    pending = {}
+
+    def on_request(request_type, name, response_time, exception=None, **kwargs):
+        entry = pending.setdefault(name, [request_type, 0, 0.0, LatencyHistogram(), 0])
+        entry[1] += 1
+        entry[2] += response_time
+        entry[3].record(response_time)
+        entry[4] += exception is not None
+
+    def on_report(client_id, data):
+        data["tinyinsta_hists"] = {
+            name: [request_type, count, total, hist.to_bytes(), errors]
+            for name, (request_type, count, total, hist, errors) in pending.items()}
+        pending.clear()
+
+    environment.events.request.add_listener(on_request)
+    environment.events.report_to_master.add_listener(on_report)
 
 
 class TinyInstaUser(HttpUser):
     """Utilisateur virtuel testant une timeline unique."""
-    
-    wait_time = between(0.1, 0.5)
-    
+
+    wait_time = between(WAIT_MIN, WAIT_MAX)
+    samplers = {}
+
     def on_start(self):
-        """Assigne un user_id unique à chaque utilisateur Locust."""
-        self.user_id = random.randint(1, 1000)
-    
-    @task
+        """Assigne un user_id (tiré selon sa popularité) à chaque utilisateur Locust."""
+        options = self.environment.parsed_options
+        key = (options.dataset_users, options.zipf)
+        if key not in self.samplers:
+            self.samplers[key] = UserSampler(*key)
+        self.sampler = self.samplers[key]
+        self.namespace = options.namespace
+        self.ns_query = f"?namespace={self.namespace}" if self.namespace else ""
+        self.user_id = self.sampler.sample()
+        self.url = timeline_url(self.user_id, self.namespace)
+        self.followed = set()
+        self.targets = [tuple(int(i) for i in pair.split(":"))
+                        for pair in options.write_targets.split(",") if pair]
+        self.pollers = []
+
+    def on_stop(self):
+        gevent.killall(self.pollers, block=False)
+
+    def check(self, response):
+        if response.status_code == 200:
+            response.success()
+        else:
+            response.failure(f"Status {response.status_code}")
+
+    def report_server_timing(self, response):
+        """Rapporte les phases de l'en-tête Server-Timing d'une réponse (type SERVER)."""
+        header = response.headers.get("Server-Timing")
+        if response.status_code != 200 or not header:
+            return
+        durations, rpcs = parse_server_timing(header)
+        for phase, duration in [*durations.items(), ("rpc", rpcs)]:
+            self.environment.events.request.fire(
+                request_type=SERVER_TIMING_TYPE, name=server_timing_name(phase),
+                response_time=duration, response_length=0, exception=None, context={})
+
     def get_timeline(self):
         """Récupère la timeline de cet utilisateur."""
         with self.client.get(
-            f"/api/timeline?user=user{self.user_id}&limit=20",
+            self.url,
             catch_response=True,
             name="/api/timeline"
         ) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Status {response.status_code}")
+            self.check(response)
+        self.report_server_timing(response)
+
+    def scroll_timeline(self):
+        """Fait défiler la timeline sur --scroll-pages pages en suivant le curseur."""
+        cursor = None
+        for page in range(1, self.environment.parsed_options.scroll_pages + 1):
+            with self.client.get(
+                timeline_url(self.user_id, self.namespace, cursor=cursor),
+                catch_response=True,
+                name=f"/api/timeline [page {page}]"
+            ) as response:
+                self.check(response)
+                try:
+                    cursor = response.json().get("cursor")
+                except ValueError:
+                    cursor = None
+            self.report_server_timing(response)
+            if not cursor:
+                break
+
+    def create_post(self):
+        """Publie un post au nom de cet utilisateur."""
+        with self.client.post(
+            f"/api/post{self.ns_query}",
+            json={"user": f"user{self.user_id}", "content": f"Post locust de user{self.user_id}"},
+            catch_response=True,
+            name="/api/post"
+        ) as response:
+            self.check(response)
+
+    def toggle_follow(self):
+        """Suit un user populaire, ou cesse de suivre un user déjà suivi."""
+        target = self.sampler.sample()
+        if target == self.user_id:
+            return
+        action = "unfollow" if target in self.followed else "follow"
+        with self.client.post(
+            f"/api/{action}{self.ns_query}",
+            json={"user": f"user{self.user_id}", "target": f"user{target}"},
+            catch_response=True,
+            name=f"/api/{action}"
+        ) as response:
+            self.check(response)
+        self.followed.symmetric_difference_update({target})
+
+
+    def publish(self):
+        """Publie au nom d'un auteur cible puis attend le post chez un de ses followers."""
+        author, follower = random.choice(self.targets) if self.targets else (self.user_id, None)
+        start = time.perf_counter()
+        with self.client.post(
+            f"/api/post{self.ns_query}",
+            json={"user": f"user{author}", "content": f"Post locust de user{author}"},
+            catch_response=True,
+            name="/api/post"
+        ) as response:
+            self.check(response)
+            try:
+                post_id = response.json().get("id")
+            except ValueError:
+                post_id = None
+        if follower is not None and post_id is not None:
+            self.pollers = [g for g in self.pollers if not g.dead]
+            self.pollers.append(gevent.spawn(self.wait_visible, follower, post_id, start))
+
+    def wait_visible(self, follower: int, post_id, start: float):
+        """Sonde la timeline de `follower` jusqu'à y voir `post_id` (ou VISIBILITY_TIMEOUT)."""
+        exception = None
+        while True:
+            with self.client.get(
+                timeline_url(follower, self.namespace),
+                catch_response=True,
+                name="/api/timeline [visibility poll]"
+            ) as response:
+                self.check(response)
+                try:
+                    timeline = response.json().get("timeline", [])
+                except ValueError:
+                    timeline = []
+            if any(p.get("id") == post_id for p in timeline):
+                break
+            if time.perf_counter() - start > VISIBILITY_TIMEOUT:
+                exception = TimeoutError(f"post {post_id} invisible après {VISIBILITY_TIMEOUT}s")
+                break
+            gevent.sleep(VISIBILITY_POLL)
+        self.environment.events.request.fire(
+            request_type="VISIBLE", name="/api/post [visibility]",
+            response_time=(time.perf_counter() - start) * 1000, response_length=0,
+            exception=exception, context={})
+
+
+def profile_tasks(profile: str) -> list:
+    """Liste pondérée des tâches d'un profil, au format de `User.tasks`."""
+    return [getattr(TinyInstaUser, name)
+            for name, weight in PROFILES[profile].items() for _ in range(weight)]
+
+
+def profile_user_class(profile: str) -> type:
+    """Sous-classe de TinyInstaUser exécutant les tâches du profil `profile`."""
+    user_class = type(f"TinyInsta{profile.capitalize()}User", (TinyInstaUser,), {})
+    # Affecté après coup : la métaclasse de Locust ajouterait les tâches de la classe de base
+    user_class.tasks = profile_tasks(profile)
+    return user_class
+
+
+TinyInstaUser.tasks = profile_tasks(DEFAULT_PROFILE)
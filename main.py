@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Application TinyInsta de référence (servie par `gunicorn main:app`, cf. app.yaml).
+
+La stratégie de timeline est choisie par la variable d'environnement
+TIMELINE_STRATEGY (`pull` par défaut, ou `push`), le cache des pages par
+TIMELINE_CACHE (`none`, `memory` ou `redis://...`, cf. cache.py). Chaque
+requête peut cibler le dataset d'un namespace Datastore avec le paramètre
+`namespace`.
+
+/api/timeline renvoie un en-tête `Server-Timing` : durée de chaque phase
+(cache, followees, requêtes, fusion, sérialisation, `app` pour le total)
+et nb de RPC Datastore (`desc="rpc=N"`), cf. timeline.ServerTiming.
+
+Usage local (émulateur Datastore):
+    gcloud beta emulators datastore start --no-store-on-disk
+    $(gcloud beta emulators datastore env-init)
+    python seed.py --users 1000 --posts 10000 --follows 20
+    TIMELINE_STRATEGY=pull gunicorn -b :8080 main:app
+"""
+
+from google.cloud import datastore
+from flask import Flask, jsonify, request
+from datetime import datetime
+import os
+import socket
+import time
+os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'tinyinsta-480307')
+
+from cache import CACHE_SIZE, CACHE_TTL, make_cache
+from timeline import ServerTiming, decode_cursor, encode_cursor, get_followers, make_strategy
+
+TIMELINE_STRATEGY = os.environ.get('TIMELINE_STRATEGY', 'pull')
+TIMELINE_CACHE = os.environ.get('TIMELINE_CACHE', 'none')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Instance (et processus gunicorn) qui sert la requête : le cache memory lui est propre
+INSTANCE = os.environ.get('GAE_INSTANCE') or socket.gethostname()
+
+app = Flask(__name__)
+clients = {}
+cache = make_cache(TIMELINE_CACHE,
+                   int(os.environ.get('TIMELINE_CACHE_SIZE', CACHE_SIZE)),
+                   float(os.environ.get('TIMELINE_CACHE_TTL', CACHE_TTL)))
+
+
+def get_namespace() -> str:
+    return request.args.get('namespace') or None
+
+
+def get_client() -> datastore.Client:
+    """Client Datastore du namespace de la requête (un client réutilisé par namespace)."""
+    namespace = get_namespace()
+    if namespace not in clients:
+        clients[namespace] = datastore.Client(namespace=namespace)
+    return clients[namespace]
+
+
+def get_strategy():
+    return make_strategy(TIMELINE_STRATEGY, get_client())
+
+
+def bad_request(message: str):
+    return jsonify({'error': message}), 400
+
+
+@app.get('/api/timeline')
+def timeline():
+    """
+    Les `limit` posts les plus récents des followees de `user`, à partir du
+    curseur `cursor` renvoyé par la page précédente. `cursor` vaut null sur
+    la dernière page.
+    """
+    start = time.perf_counter()
+    user = request.args.get('user')
+    if not user:
+        return bad_request("paramètre 'user' requis")
+    limit = min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT)
+    if limit < 1:
+        return bad_request("paramètre 'limit' >= 1 requis")
+    cursor = request.args.get('cursor')
+    before, exclude = None, set()
+    if cursor:
+        try:
+            before, exclude = decode_cursor(cursor)
+        except ValueError as e:
+            return bad_request(str(e))
+
+    namespace = get_namespace()
+    page_key = f"{limit}:{cursor or ''}"
+    timing = ServerTiming()
+    with timing.phase('cache'):
+        page = cache.get(namespace, user, page_key)
+    if page is None:
+        posts = get_strategy().get(user, limit, before, exclude, timing)
+        next_cursor = encode_cursor(posts, before, exclude) if len(posts) == limit else None
+        page = {'timeline': posts, 'cursor': next_cursor}
+        with timing.phase('cache'):
+            cache.set(namespace, user, page_key, page)
+    with timing.phase('serialize'):
+        response = jsonify({'user': user, 'strategy': TIMELINE_STRATEGY, **page})
+    timing.add('app', (time.perf_counter() - start) * 1000)
+    response.headers['Server-Timing'] = timing.header()
+    return response
+
+
+@app.post('/api/post')
+def create_post():
+    """Publie un post ; en stratégie push, il est recopié chez les followers."""
+    data = request.get_json(silent=True) or {}
+    if not data.get('user'):
+        return bad_request("champ 'user' requis")
+    client = get_client()
+    post = datastore.Entity(client.key('Post'))
+    post.update({'author': data['user'], 'content': data.get('content', ''),
+                 'created': datetime.utcnow()})
+    client.put(post)
+    # Les followers ne servent qu'au fan-out push et à l'invalidation du cache
+    needs_followers = TIMELINE_STRATEGY == 'push' or cache.name != 'none'
+    followers = get_followers(client, post['author']) if needs_followers else []
+    get_strategy().on_post(post, followers)
+    cache.invalidate(get_namespace(), followers)
+    return jsonify({'id': post.key.id, 'author': post['author']})
+
+
+def update_follows(add: bool):
+    data = request.get_json(silent=True) or {}
+    user, target = data.get('user'), data.get('target')
+    if not user or not target or user == target:
+        return bad_request("champs 'user' et 'target' (distincts) requis")
+    client = get_client()
+    with client.transaction():
+        entity = client.get(client.key('User', user))
+        if entity is None:
+            return jsonify({'error': f"user inconnu: {user}"}), 404
+        follows = set(entity.get('follows', []))
+        changed = (target not in follows) if add else (target in follows)
+        follows.symmetric_difference_update({target} if changed else set())
+        entity['follows'] = sorted(follows)
+        client.put(entity)
+    if changed:
+        cache.invalidate(get_namespace(), [user])
+        strategy = get_strategy()
+        if add:
+            strategy.on_follow(user, target)
+        else:
+            strategy.on_unfollow(user, target)
+    return jsonify({'user': user, 'follows': len(follows)})
+
+
+@app.post('/api/follow')
+def follow():
+    return update_follows(add=True)
+
+
+@app.post('/api/unfollow')
+def unfollow():
+    return update_follows(add=False)
+
+
+@app.get('/api/cache/stats')
+def cache_stats():
+    """Compteurs du cache de timelines (par instance pour le backend memory)."""
+    return jsonify({**cache.stats(), 'instance': f"{INSTANCE}:{os.getpid()}"})
+
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=int(os.environ.get('PORT', 8080)), debug=True)
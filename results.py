@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Base de résultats des benchmarks TinyInsta (SQLite).
+
+benchmark.py y enregistre chaque run avec son contexte : commit git, dataset
+(manifest de seed.py), moteur, mode, profil, concurrence, métriques et
+histogramme des latences. Les runs d'une même campagne partagent un label
+(--label de benchmark.py, par défaut le SHA court du commit).
+
+Usage:
+    python results.py list
+    python results.py compare BASE CANDIDAT
+    python results.py compare BASE CANDIDAT --test fanout --alpha 0.01
+
+`compare` confronte, pour chaque (test, PARAM) présent dans les deux labels,
+les p50, p99 et débits des runs avec un test t de Welch : une dégradation
+est signalée si elle est significative (p < alpha) et d'au moins
+--min-change en relatif. Le code de sortie vaut 1 en cas de régression.
+"""
+
+from datetime import datetime
+import argparse
+import json
+import math
+import os
+import sqlite3
+import subprocess
+import sys
+
+from histogram import LatencyHistogram
+from timeseries import SeriesData
+
+RESULTS_DB = "results.db"
+SQLITE_TIMEOUT = 30     # Attente max du verrou (s) si plusieurs benchmarks écrivent
+ALPHA = 0.05
+MIN_CHANGE = 0.05
+
+# Métriques comparées -> sens de l'amélioration (+1 : plus grand est mieux)
+COMPARED = {"p50": -1, "p99": -1, "rps": +1}
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    label TEXT NOT NULL,
+    git_sha TEXT,
+    git_dirty INTEGER,
+    test TEXT NOT NULL,
+    param INTEGER NOT NULL,
+    run INTEGER NOT NULL,
+    url TEXT,
+    namespace TEXT,
+    dataset TEXT,
+    engine TEXT,
+    mode TEXT,
+    profile TEXT,
+    users INTEGER,
+    rate REAL,
+    workers INTEGER,
+    avg_ms REAL,
+    p50 REAL,
+    p90 REAL,
+    p95 REAL,
+    p99 REAL,
+    max_ms REAL,
+    rps REAL,
+    requests INTEGER,
+    failures INTEGER,
+    row TEXT,
+    hist BLOB,
+    series BLOB
+);
+CREATE INDEX IF NOT EXISTS runs_label ON runs (label, test, param);
+"""
+
+
+def git_revision() -> tuple:
+    """(SHA du commit de ce dépôt, arbre modifié ?) ; (None, None) hors dépôt git."""
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                             text=True, check=True, cwd=REPO_DIR).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True, cwd=REPO_DIR).stdout
+        return sha, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def default_label() -> str:
+    """Label par défaut d'une campagne : SHA court, suffixé -dirty si l'arbre est modifié."""
+    sha, dirty = git_revision()
+    if sha is None:
+        return datetime.now().strftime("%Y%m%d-%H%M%S")
+    return sha[:10] + ("-dirty" if dirty else "")
+
+
+class ResultStore:
+    """Accès à la table `runs` de la base SQLite."""
+
+    def __init__(self, path: str = RESULTS_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        # Bases créées avant l'ajout des séries par seconde
+        columns = {r["name"] for r in self.conn.execute("PRAGMA table_info(runs)")}
+        if "series" not in columns:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN series BLOB")
+
+    def close(self):
+        self.conn.close()
+
+    def save_run(self, context: dict, test: str, param: int, run: int, row: dict,
+                 metrics: dict, users: int = None, series=None) -> int:
+        """
+        Enregistre un run : `context` décrit la campagne (label, git_sha,
+        git_dirty, url, namespace, dataset, engine, mode, workers), `row` est
+        sa ligne CSV, `metrics` ses métriques (histogramme sous "hist") et
+        `series` sa série par seconde (timeseries.TimeSeries).
+        """
+        hist = metrics.get("hist")
+        values = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "label": context["label"],
+            "git_sha": context.get("git_sha"),
+            "git_dirty": context.get("git_dirty"),
+            "test": test,
+            "param": param,
+            "run": run,
+            "url": context.get("url"),
+            "namespace": context.get("namespace"),
+            "dataset": json.dumps(context.get("dataset"), default=str, sort_keys=True),
+            "engine": context.get("engine"),
+            "mode": metrics.get("mode", context.get("mode")),
+            "profile": row.get("PROFILE"),
+            "users": users,
+            "rate": metrics.get("rate"),
+            "workers": metrics.get("workers", context.get("workers")),
+            "avg_ms": metrics["temps_moyen"],
+            "p50": metrics["p50"],
+            "p90": metrics["p90"],
+            "p95": metrics["p95"],
+            "p99": metrics["p99"],
+            "max_ms": metrics["max"],
+            "rps": metrics["rps"],
+            "requests": metrics["requetes"],
+            "failures": metrics["echecs"],
+            "row": json.dumps(row, default=str),
+            "hist": hist.to_bytes() if hist is not None else None,
+            "series": series.to_bytes() if series is not None else None,
+        }
+        with self.conn:
+            cursor = self.conn.execute(
+                f"INSERT INTO runs ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()))
+        return cursor.lastrowid
+
+    def labels(self) -> list:
+        """[(label, nb de runs, premier run, dernier run)], du plus récent au plus ancien."""
+        return self.conn.execute(
+            "SELECT label, COUNT(*), MIN(created), MAX(created) FROM runs "
+            "GROUP BY label ORDER BY MAX(created) DESC").fetchall()
+
+    def latest_label(self) -> str:
+        labels = self.labels()
+        return labels[0][0] if labels else None
+
+    def runs(self, label: str, test: str = None) -> list:
+        """Runs valides d'un label (runs en erreur, sans requête, exclus)."""
+        query = "SELECT * FROM runs WHERE label = ? AND requests > 0 AND p99 >= 0"
+        params = [label]
+        if test:
+            query += " AND test = ?"
+            params.append(test)
+        return self.conn.execute(query + " ORDER BY test, param, run", params).fetchall()
+
+    def rows(self, label: str, test: str) -> list:
+        """Lignes CSV des runs d'un label pour un test (format de benchmark.make_row)."""
+        return [json.loads(r["row"]) for r in self.runs(label, test)]
+
+    def histograms(self, label: str, test: str) -> dict:
+        """Histogrammes fusionnés par PARAM des runs d'un label : {param: histogramme}."""
+        hists = {}
+        for r in self.runs(label, test):
+            if r["hist"] is not None:
+                hists.setdefault(r["param"], LatencyHistogram()).merge(
+                    LatencyHistogram.from_bytes(r["hist"], f"{label}/{test}/{r['id']}"))
+        return dict(sorted(hists.items()))
+
+    def series(self, label: str, test: str) -> dict:
+        """Séries par seconde des runs d'un label : {param: {run: SeriesData}}."""
+        series = {}
+        for r in self.runs(label, test):
+            if r["series"] is not None:
+                series.setdefault(r["param"], {})[r["run"]] = SeriesData.from_bytes(
+                    r["series"], f"{label}/{test}/{r['id']}")
+        return dict(sorted(series.items()))
+
+
+# =============================================================================
+# TEST DE WELCH
+# =============================================================================
+
+def _betacf(a: float, b: float, x: float, iterations: int = 200, eps: float = 1e-12) -> float:
+    """Fraction continue de la fonction bêta incomplète (méthode de Lentz)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, iterations):
+        for aa in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                   -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + aa * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < eps:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """Fonction bêta incomplète régularisée I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def welch_test(a: list, b: list):
+    """p-valeur bilatérale du test t de Welch (moyennes de a et b), None si < 2 runs."""
+    if len(a) < 2 or len(b) < 2:
+        return None
+    mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+    var_a = sum((x - mean_a) ** 2 for x in a) / (len(a) - 1)
+    var_b = sum((x - mean_b) ** 2 for x in b) / (len(b) - 1)
+    se2 = var_a / len(a) + var_b / len(b)
+    if se2 == 0:
+        return 1.0 if mean_a == mean_b else 0.0
+    t = (mean_b - mean_a) / math.sqrt(se2)
+    df = se2 ** 2 / ((var_a / len(a)) ** 2 / (len(a) - 1) + (var_b / len(b)) ** 2 / (len(b) - 1))
+    return betainc(df / 2, 0.5, df / (df + t * t))
+
+
+def compare(store: ResultStore, baseline: str, candidate: str, test: str = None,
+            alpha: float = ALPHA, min_change: float = MIN_CHANGE) -> list:
+    """
+    Compare deux labels, métrique par métrique, pour chaque (test, PARAM)
+    commun. Retourne des dicts (test, param, metric, base, candidat,
+    variation relative, p, verdict) ; verdict vaut "régression",
+    "amélioration", "stable" ou "non testable" (moins de 2 runs d'un côté).
+    """
+    def group(label):
+        groups = {}
+        for r in store.runs(label, test):
+            groups.setdefault((r["test"], r["param"]), []).append(r)
+        return groups
+
+    base_groups, cand_groups = group(baseline), group(candidate)
+    report = []
+    for key in sorted(base_groups.keys() & cand_groups.keys()):
+        for metric, better in COMPARED.items():
+            a = [r[metric] for r in base_groups[key]]
+            b = [r[metric] for r in cand_groups[key]]
+            mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+            change = (mean_b - mean_a) / mean_a if mean_a else 0.0
+            p = welch_test(a, b)
+            if p is None:
+                verdict = "non testable"
+            elif p < alpha and abs(change) >= min_change:
+                verdict = "amélioration" if change * better > 0 else "régression"
+            else:
+                verdict = "stable"
+            report.append({"test": key[0], "param": key[1], "metric": metric,
+                           "base": mean_a, "candidat": mean_b, "variation": change,
+                           "p": p, "verdict": verdict})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base de résultats des benchmarks TinyInsta")
+    parser.add_argument("--db", default=RESULTS_DB, help=f"Base SQLite (default: {RESULTS_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Liste les labels enregistrés")
+    compare_parser = commands.add_parser("compare", help="Compare deux labels")
+    compare_parser.add_argument("baseline", help="Label de référence")
+    compare_parser.add_argument("candidate", help="Label à évaluer")
+    compare_parser.add_argument("--test", help="Restreint la comparaison à un test")
+    compare_parser.add_argument("--alpha", type=float, default=ALPHA,
+                                help=f"Seuil de significativité (default: {ALPHA})")
+    compare_parser.add_argument("--min-change", type=float, default=MIN_CHANGE,
+                                help=f"Variation relative minimale signalée (default: {MIN_CHANGE})")
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    if args.command == "list":
+        for label, count, first, last in store.labels():
+            print(f"{label:20} {count:5} runs  {first} -> {last}")
+        return
+
+    report = compare(store, args.baseline, args.candidate, args.test, args.alpha, args.min_change)
+    if not report:
+        print(f"❌ Aucun (test, PARAM) commun à {args.baseline} et {args.candidate}")
+        sys.exit(1)
+
+    print(f"{'TEST':10} {'PARAM':>6} {'MÉTRIQUE':8} {'BASE':>10} {'CANDIDAT':>10} "
+          f"{'VAR.':>8} {'p':>7}  VERDICT")
+    for line in report:
+        p = f"{line['p']:.3f}" if line["p"] is not None else "-"
+        flag = "❌ " if line["verdict"] == "régression" else ""
+        print(f"{line['test']:10} {line['param']:>6} {line['metric']:8} {line['base']:>10.2f} "
+              f"{line['candidat']:>10.2f} {line['variation']:>+8.1%} {p:>7}  {flag}{line['verdict']}")
+
+    regressions = [line for line in report if line["verdict"] == "régression"]
+    print(f"\n{len(regressions)} régression(s) significative(s) "
+          f"(p < {args.alpha}, variation >= {args.min_change:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
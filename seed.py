@@ -5,80 +5,734 @@ Script de seed LOCAL pour Tiny Instagram.
 
 Usage:
     python seed.py --users 1000 --posts 50000 --follows 20
+    python seed.py --users 100000 --posts 0 --follows 20 --workers 16
+    python seed.py --users 1000 --posts 1000000 --follows 20 --resume
+    python seed.py --users 1000 --posts 100000 --follows 20 --extend
+    python seed.py --users 1000 --posts 100000 --follows 50 --namespace fanout50
+    python seed.py --users 100000 --posts 1000000 --follows 50 --graph pa --activity zipf --seed 42
+    python seed.py --users 1000 --posts 1000000 --follows 20 --export post1000.snap
+    python seed.py --restore post1000.snap --namespace post1000 --workers 32
 """
 
-from google.cloud import datastore
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import argparse
+import json
+import mmap
 import random
+import struct
+import sys
+import time
 from datetime import datetime, timedelta
 import os
 
+from storage import add_storage_arguments, make_storage
 
-os.environ['GOOGLE_CLOUD_PROJECT'] = 'tinyinsta-480307'
+BATCH_SIZE = 500   # Limite Datastore pour get_multi / put_multi
+NB_WORKERS = 8
+CHECKPOINT_FILE = ".seed_checkpoint.json"
+MANIFEST_KIND = 'Manifest'
+MANIFEST_NAME = 'dataset'
 
-def seed_data(users: int, posts: int, follows: int):
-    """Crée des utilisateurs et des posts directement dans Datastore."""
-    client = datastore.Client()
-    
-    user_names = [f"user{i}" for i in range(1, users + 1)]
-    
-    print(f"Création de {users} utilisateurs...")
-    created_users = 0
-    for name in user_names:
-        key = client.key('User', name)
-        entity = client.get(key)
-        if entity is None:
-            entity = datastore.Entity(key)
-            entity['follows'] = []
-            client.put(entity)
-            created_users += 1
-    
+GRAPH_MODELS = ['uniform', 'zipf', 'pa']
+ACTIVITY_MODELS = ['uniform', 'zipf']
+ZIPF_EXPONENT = 1.0
+PA_GROWTH = 1.05      # Attachement préférentiel : croissance relative de chaque vague d'arrivées
+MAX_REDRAWS = 100
+
+# Ids des posts : des ids croissants écrits en parallèle tombent tous en fin
+# de plage de clés (hotspot qui plafonne le débit d'écriture Datastore). Le
+# post d'index i a donc l'id (i * POST_ID_MULT mod 2**POST_ID_BITS) + 1 :
+# déterministe, bijectif (multiplicateur impair), dispersé, et < 2**53 pour
+# rester exact en JSON.
+POST_ID_BITS = 52
+POST_ID_MULT = 0x9E3779B97F4A7     # 2**52 / nombre d'or, impair
+POST_IDS = 'scattered'             # Schéma d'ids enregistré dans le manifest
+
+# Snapshot : magic, taille de l'en-tête JSON, puis tableaux alignés (mmap)
+SNAPSHOT_MAGIC = b"TISNAP01"
+SNAPSHOT_ALIGN = 64
+EPOCH = datetime(1970, 1, 1)
+
+
+def checkpoint_file(namespace: str = None) -> str:
+    """Fichier de checkpoint par défaut, distinct par namespace (seeds en parallèle)."""
+    return f".seed_checkpoint.{namespace}.json" if namespace else CHECKPOINT_FILE
+
+
+def chunks(items: list, size: int):
+    """Découpe une liste en tranches de `size` éléments."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def report_phase(label: str, count: int, elapsed: float):
+    """Affiche le débit d'une phase du seed."""
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"  -> {count} {label} en {elapsed:.1f}s ({rate:.0f} entités/s)")
+
+
+def run_batches(func, batches, workers: int) -> int:
+    """Exécute `func` sur chaque batch via un pool de threads borné, retourne la somme."""
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for n in executor.map(func, batches):
+            total += n
+    return total
+
+
+# =============================================================================
+# GRAPHE ET ACTIVITÉ (NumPy)
+# =============================================================================
+
+def zipf_weights(n: int, exponent: float = ZIPF_EXPONENT) -> np.ndarray:
+    """Probabilités ∝ 1/rang**exponent : l'index 0 (user1) est le plus populaire."""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    return weights / weights.sum()
+
+
+def draw_distinct(rows: np.ndarray, k: int, candidates: int, p: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+    """
+    Matrice (len(rows), k) de followees distincts tirés dans [0, candidates)
+    selon `p` (uniforme si None), sans la ligne elle-même. Tirage avec remise
+    puis retirage des seules cases en doublon ; les rares lignes encore en
+    échec après MAX_REDRAWS passes sont tirées sans remise une par une.
+    """
+    def draw(size):
+        if p is None:
+            return rng.integers(0, candidates, size=size)
+        return rng.choice(candidates, size=size, p=p)
+
+    targets = draw((len(rows), k))
+    for _ in range(MAX_REDRAWS):
+        order = np.argsort(targets, axis=1)
+        ordered = np.take_along_axis(targets, order, axis=1)
+        dup_sorted = np.zeros(targets.shape, dtype=bool)
+        dup_sorted[:, 1:] = ordered[:, 1:] == ordered[:, :-1]
+        bad = np.zeros(targets.shape, dtype=bool)
+        np.put_along_axis(bad, order, dup_sorted, axis=1)
+        bad |= targets == rows[:, None]
+        if not bad.any():
+            return targets
+        targets[bad] = draw(int(bad.sum()))
+
+    for r in np.flatnonzero(bad.any(axis=1)):
+        weights = np.ones(candidates) if p is None else p.copy()
+        if rows[r] < candidates:
+            weights[rows[r]] = 0
+        targets[r] = rng.choice(candidates, size=k, replace=False, p=weights / weights.sum())
+    return targets
+
+
+def follow_graph(users: int, follows: int, model: str = 'uniform',
+                 exponent: float = ZIPF_EXPONENT, seed: int = 0) -> np.ndarray:
+    """
+    Graphe de follows vectorisé : matrice (users, k) des index (0-based) des
+    followees de chaque user, k = min(follows, users - 1).
+
+    - uniform : followees tirés uniformément ;
+    - zipf    : followees tirés selon la popularité de Zipf (célébrités) ;
+    - pa      : attachement préférentiel, les users arrivent par vagues et
+                suivent des users plus anciens ∝ (nb de followers + 1).
+    """
+    k = min(follows, users - 1)
+    if users < 2 or k <= 0:
+        return np.zeros((users, 0), dtype=np.int32)
+    rng = np.random.default_rng([seed, 1])
+    if model == 'uniform':
+        return draw_distinct(np.arange(users), k, users, None, rng).astype(np.int32)
+    if model == 'zipf':
+        return draw_distinct(np.arange(users), k, users, zipf_weights(users, exponent),
+                             rng).astype(np.int32)
+
+    targets = np.empty((users, k), dtype=np.int32)
+    first = k + 1
+    targets[:first] = draw_distinct(np.arange(first), k, first, None, rng)
+    in_degree = np.bincount(targets[:first].ravel(), minlength=users)
+    start = first
+    while start < users:
+        end = min(users, max(start + 1, int(start * PA_GROWTH)))
+        weights = in_degree[:start] + 1.0
+        wave = draw_distinct(np.arange(start, end), k, start, weights / weights.sum(), rng)
+        targets[start:end] = wave
+        in_degree += np.bincount(wave.ravel(), minlength=users)
+        start = end
+    return targets
+
+
+def degree_summary(targets: np.ndarray, users: int) -> dict:
+    """
+    Résumé de la distribution des degrés entrants (nb de followers) : quantiles
+    et histogramme par puissances de 2 (case i = degré dans [2**i - 1, 2**(i+1) - 1)).
+    """
+    in_degree = np.bincount(targets.ravel(), minlength=users)
+    return {
+        'in_degree_max': int(in_degree.max()) if users else 0,
+        'in_degree_p50': float(np.percentile(in_degree, 50)) if users else 0.0,
+        'in_degree_p99': float(np.percentile(in_degree, 99)) if users else 0.0,
+        'in_degree_log2_hist': np.bincount(np.log2(in_degree + 1).astype(int)).tolist(),
+    }
+
+
+def author_weights(users: int, model: str = 'uniform',
+                   exponent: float = ZIPF_EXPONENT) -> np.ndarray:
+    """Probabilités d'être l'auteur d'un post (None = uniforme)."""
+    return zipf_weights(users, exponent) if model == 'zipf' else None
+
+
+# =============================================================================
+# CHECKPOINT
+# =============================================================================
+
+def load_checkpoint(path: str):
+    """Charge le checkpoint d'un seed interrompu (None si absent)."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: dict):
+    """Écrit le checkpoint de façon atomique (fichier temporaire + rename)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+def load_manifest(client):
+    """
+    Lit le manifest du dataset présent dans le stockage (None si absent) ;
+    `client` est un backend de storage.py ou un datastore.Client.
+    """
+    entity = client.get(client.key(MANIFEST_KIND, MANIFEST_NAME))
+    return dict(entity) if entity is not None else None
+
+
+def save_manifest(client, manifest: dict):
+    """Enregistre la configuration du dataset effectivement écrit."""
+    entity = client.entity(client.key(MANIFEST_KIND, MANIFEST_NAME))
+    entity.update(manifest)
+    entity['updated'] = datetime.utcnow()
+    client.put(entity)
+
+
+# =============================================================================
+# PHASES
+# =============================================================================
+
+def seed_users(client, user_names: list, workers: int, batch_size: int) -> int:
+    """Crée les users absents (1 get_multi + 1 put_multi par batch)."""
+
+    def create_users(names: list) -> int:
+        keys = [client.key('User', name) for name in names]
+        existing = {e.key.name for e in client.get_multi(keys)}
+        missing = []
+        for key in keys:
+            if key.name not in existing:
+                entity = client.entity(key)
+                entity['follows'] = []
+                missing.append(entity)
+        if missing:
+            client.put_multi(missing)
+        return len(missing)
+
+    print(f"Création de {len(user_names)} utilisateurs ({workers} workers)...")
+    start = time.time()
+    created = run_batches(create_users, chunks(user_names, batch_size), workers)
+    report_phase("users créés", created, time.time() - start)
+    return created
+
+
+def seed_follows(client, graph: np.ndarray, workers: int,
+                 batch_size: int, first_user: int = 0) -> int:
+    """
+    Complète les follows de chaque user (à partir de `first_user`) avec les
+    followees de sa ligne de `graph` ; les follows existants sont conservés.
+    """
+    users, follows = graph.shape
+
+    def assign_follows(indices: list) -> int:
+        keys = [client.key('User', f"user{i + 1}") for i in indices]
+        entities = {e.key.name: e for e in client.get_multi(keys)}
+        batch = []
+        for i, key in zip(indices, keys):
+            entity = entities.get(key.name)
+            if entity is None:
+                continue
+            current = entity.get('follows', [])
+            missing = follows - len(current)
+            if missing <= 0:
+                continue
+            known = set(current)
+            added = [f"user{j + 1}" for j in graph[i] if f"user{j + 1}" not in known]
+            entity['follows'] = sorted(current + added[:missing])
+            batch.append(entity)
+        if batch:
+            client.put_multi(batch)
+        return len(batch)
+
+    if users < 2 or follows <= 0 or first_user >= users:
+        return 0
     print(f"Attribution des follows ({follows} par user)...")
-    for name in user_names:
-        key = client.key('User', name)
-        entity = client.get(key)
-        others = [u for u in user_names if u != name]
-        if others and follows > 0:
-            selection = random.sample(others, min(follows, len(others)))
-            entity['follows'] = sorted(set(entity.get('follows', [])).union(selection))
-            client.put(entity)
-    
-    print(f"Création de {posts} posts...")
+    start = time.time()
+    indices = list(range(first_user, users))
+    updated = run_batches(assign_follows, chunks(indices, batch_size), workers)
+    report_phase("users mis à jour", updated, time.time() - start)
+    return updated
+
+
+def post_author_batches(users: int, posts: int, batch_size: int, rng_seed: int,
+                        start_batch: int = 0, weights: np.ndarray = None):
+    """
+    Auteurs (index 0-based) des posts, batch par batch : (index du batch, auteurs).
+    Chaque batch a son propre RNG dérivé de (rng_seed, index) ; les auteurs
+    sont tirés en bloc selon `weights` (activité, uniforme si None).
+    """
+    nb_batches = (posts + batch_size - 1) // batch_size
+    for b in range(start_batch, nb_batches):
+        rng = np.random.default_rng([rng_seed, 2, b])
+        first = b * batch_size
+        yield b, rng.choice(users, size=min(posts, first + batch_size) - first, p=weights)
+
+
+def post_key_id(index: int) -> int:
+    """Id Datastore du post d'index `index` (0 -> 1), dispersé dans la plage des clés."""
+    return (index * POST_ID_MULT) % (1 << POST_ID_BITS) + 1
+
+
+def post_entity(client, index: int, author: str,
+                created: datetime):
+    """Entité Post (clé numérique fixe : réécrire un post ne crée pas de doublon)."""
+    p = client.entity(client.key('Post', post_key_id(index)))
+    p['author'] = author
+    p['content'] = f"Post {index + 1} by {author}"
+    p['created'] = created
+    return p
+
+
+def generate_post_batches(client, users: int, posts: int,
+                          batch_size: int, rng_seed: int, base_time: datetime,
+                          start_batch: int = 0, first_post: int = 0,
+                          weights: np.ndarray = None):
+    """
+    Générateur de batches de posts (index, entités), produits à la demande.
+
+    Un batch rejoué après reprise réécrit exactement les mêmes entités, sans
+    doublons. Les posts d'index < `first_post` (déjà présents, mode
+    --extend) sont tirés mais pas réécrits, pour que le dataset étendu soit
+    identique à un seed complet de même graine — à nombre d'users constant
+    seulement : les auteurs étant tirés parmi `users`, agrandir --users change
+    aussi l'auteur des nouveaux posts.
+    """
+    batches = post_author_batches(users, posts, batch_size, rng_seed,
+                                  max(start_batch, first_post // batch_size), weights)
+    for b, authors in batches:
+        first = b * batch_size
+        batch = [post_entity(client, i, f"user{a + 1}", base_time - timedelta(seconds=i))
+                 for i, a in enumerate(authors, start=first) if i >= first_post]
+        yield b, batch
+
+
+def seed_posts(client, users: int, posts: int, workers: int,
+               batch_size: int, state: dict, checkpoint_path: str,
+               weights: np.ndarray = None) -> int:
+    """
+    Pipeline producteur/consommateur : le générateur produit les batches,
+    `workers` put_multi restent en vol (au plus 2*workers batches en mémoire).
+    Le checkpoint enregistre le premier batch non encore écrit de façon contiguë.
+    """
+    base_time = datetime.fromisoformat(state['base_time'])
+    first_post = state.get('first_post', 0)
+    next_batch = max(state['next_batch'], first_post // batch_size)
+    batches = generate_post_batches(client, users, posts, batch_size, state['rng_seed'],
+                                    base_time, next_batch, first_post, weights)
+
+    print(f"Création de {posts - first_post} posts ({workers} écritures en parallèle)...")
+    if next_batch > first_post // batch_size:
+        print(f"  Reprise au batch {next_batch} ({next_batch * batch_size} posts déjà écrits)")
+    start = time.time()
+    max_inflight = workers * 2
+    inflight = {}
+    completed = set()
     created_posts = 0
+    last_save = time.time()
+
+    def collect(done):
+        """Traite les écritures terminées et avance la frontière du checkpoint."""
+        nonlocal created_posts, next_batch, last_save
+        for fut in done:
+            b, size = inflight.pop(fut)
+            fut.result()
+            completed.add(b)
+            created_posts += size
+        while next_batch in completed:
+            completed.remove(next_batch)
+            next_batch += 1
+        if time.time() - last_save >= 1:
+            save_checkpoint(checkpoint_path, {**state, 'next_batch': next_batch})
+            print(f"  {min(next_batch * batch_size, posts)}/{posts} posts créés...")
+            last_save = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for b, batch in batches:
+                if len(inflight) >= max_inflight:
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                inflight[executor.submit(client.put_multi, batch)] = (b, len(batch))
+            while inflight:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                collect(done)
+        except Exception as e:
+            for fut in inflight:
+                fut.cancel()
+            save_checkpoint(checkpoint_path, {**state, 'next_batch': next_batch})
+            print(f"\n❌ Erreur pendant l'écriture des posts: {e}")
+            print(f"   Checkpoint: batch {next_batch}. Relancer avec --resume pour reprendre.")
+            sys.exit(1)
+
+    report_phase("posts créés", created_posts, time.time() - start)
+    return created_posts
+
+
+def seed_data(users: int, posts: int, follows: int, workers: int = NB_WORKERS,
+              batch_size: int = BATCH_SIZE, resume: bool = False,
+              checkpoint_path: str = None, rng_seed: int = None,
+              extend: bool = False, namespace: str = None, graph: str = 'uniform',
+              activity: str = 'uniform', exponent: float = ZIPF_EXPONENT, storage=None):
+    """
+    Crée des utilisateurs et des posts directement dans Datastore (ou le
+    backend `storage`, cf. storage.py ; par défaut celui de TINYINSTA_STORAGE).
+
+    En mode `extend`, le manifest décrit le dataset déjà présent et seul le
+    delta (users, follows et posts manquants) est écrit. Chaque `namespace`
+    contient un dataset indépendant (avec son propre manifest). `graph` et
+    `activity` choisissent la forme du graphe de follows et la répartition
+    des posts entre auteurs.
+    """
+    client = storage or make_storage(namespace=namespace)
+    checkpoint_path = checkpoint_path or checkpoint_file(namespace)
+    if namespace:
+        print(f"Namespace: {namespace}")
+
+    user_names = [f"user{i}" for i in range(1, users + 1)]
+    config = {'users': users, 'posts': posts, 'follows': follows, 'batch_size': batch_size,
+              'graph': graph, 'activity': activity, 'exponent': exponent}
+    shape = {'graph': graph, 'activity': activity, 'exponent': exponent}
+
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if state is not None and state['config'] != config:
+        print(f"❌ Checkpoint incompatible ({state['config']}), relancer sans --resume")
+        sys.exit(1)
+
+    created_users = 0
+    if state is None:
+        if resume:
+            print("Aucun checkpoint trouvé, seed complet.")
+        manifest = load_manifest(client) if extend else None
+        if manifest is not None:
+            present = {k: manifest[k] for k in ('users', 'posts', 'follows')}
+            present_shape = {'graph': manifest.get('graph', 'uniform'),
+                             'activity': manifest.get('activity', 'uniform'),
+                             'exponent': manifest.get('exponent', ZIPF_EXPONENT)}
+            if present_shape != shape:
+                print(f"❌ --extend impossible avec une autre forme de dataset ({present_shape}), "
+                      "vider le Datastore d'abord")
+                sys.exit(1)
+            if manifest.get('post_ids') != POST_IDS:
+                print("❌ --extend impossible : posts écrits avec des ids séquentiels, "
+                      "vider le Datastore d'abord")
+                sys.exit(1)
+            if present == {k: config[k] for k in present}:
+                print(f"✓ Dataset déjà conforme ({present}), seed ignoré")
+                return
+            if any(config[k] < present[k] for k in present):
+                print(f"❌ --extend ne peut pas réduire le dataset ({present}), "
+                      "vider le Datastore d'abord")
+                sys.exit(1)
+            print(f"Extension du dataset existant ({present})")
+            if users != present['users'] and posts > present['posts']:
+                print("  ⚠ --users modifié : les nouveaux posts ne seront pas identiques "
+                      "à ceux d'un seed complet de même graine")
+            rng_seed = manifest['rng_seed']
+            base_time = manifest['base_time'].replace(tzinfo=None)
+        else:
+            if extend:
+                print("Aucun manifest trouvé, seed complet.")
+            present = {'users': 0, 'posts': 0, 'follows': 0}
+            base_time = datetime.utcnow()
+        if rng_seed is None:
+            rng_seed = random.randrange(2 ** 32)
+
+        print(f"Génération du graphe ({graph}, {follows} follows/user)...")
+        start = time.time()
+        follow_targets = follow_graph(users, follows, graph, exponent, rng_seed)
+        report_phase("follows générés", follow_targets.size, time.time() - start)
+
+        created_users = seed_users(client, user_names[present['users']:], workers, batch_size)
+        first_user = 0 if follows > present['follows'] else present['users']
+        seed_follows(client, follow_targets, workers, batch_size, first_user)
+        state = {
+            'config': config,
+            'rng_seed': rng_seed,
+            'base_time': base_time.isoformat(),
+            'first_post': present['posts'],
+            'next_batch': 0,
+            'degrees': degree_summary(follow_targets, users),
+        }
+        save_checkpoint(checkpoint_path, state)
+    else:
+        print(f"Reprise du seed depuis {checkpoint_path} (users et follows déjà créés)")
+
+    created_posts = seed_posts(client, users, posts, workers, batch_size, state,
+                               checkpoint_path, author_weights(users, activity, exponent))
+    save_manifest(client, {
+        'users': users,
+        'posts': posts,
+        'follows': follows,
+        **shape,
+        **state['degrees'],
+        'rng_seed': state['rng_seed'],
+        'base_time': datetime.fromisoformat(state['base_time']),
+        'post_ids': POST_IDS,
+    })
+    os.remove(checkpoint_path)
+
+    print(f"  Followers: max {state['degrees']['in_degree_max']}, "
+          f"p50 {state['degrees']['in_degree_p50']:.0f}, p99 {state['degrees']['in_degree_p99']:.0f}")
+    print(f"✓ Seed terminé: {created_users} users, {created_posts} posts")
+
+
+# =============================================================================
+# SNAPSHOT
+# =============================================================================
+#
+# Fichier colonnaire, lisible par mmap sans copie :
+#   SNAPSHOT_MAGIC | taille de l'en-tête (uint64) | en-tête JSON | tableaux
+# L'en-tête contient le manifest du dataset et, pour chaque tableau, son
+# dtype, sa forme et son offset (aligné sur SNAPSHOT_ALIGN) depuis le début
+# des données. Les users sont internés : leurs noms sont stockés une fois
+# (user_offsets + user_bytes) et partout ailleurs désignés par leur index.
+#   - follow_offsets (users + 1) / follow_index : followees de chaque user ;
+#   - post_author / post_created (µs depuis l'epoch, UTC) : le post d'index i
+#     a la clé numérique post_key_id(i) et le contenu "Post {i+1} by {auteur}".
+
+def _align(offset: int) -> int:
+    return -offset % SNAPSHOT_ALIGN
+
+
+def write_snapshot(path: str, manifest: dict, arrays: dict):
+    """Écrit le manifest et les tableaux NumPy `arrays` dans un snapshot."""
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset += _align(offset)
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'manifest': manifest, 'arrays': layout}, default=str).encode()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(header)) + header)
+        f.write(b"\0" * _align(f.tell()))
+        data_start = f.tell()
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + layout[name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: str) -> tuple:
+    """(manifest, {nom: tableau}) d'un snapshot, tableaux projetés en mémoire (mmap)."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path}: pas un snapshot de dataset")
+    (size,) = struct.unpack_from("<Q", data, len(SNAPSHOT_MAGIC))
+    start = len(SNAPSHOT_MAGIC) + 8
+    header = json.loads(data[start:start + size])
+    data_start = start + size + _align(start + size)
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+        arrays[name] = np.frombuffer(data, dtype, count, data_start + info['offset']).reshape(info['shape'])
+    return header['manifest'], arrays
+
+
+def intern_names(names: list) -> dict:
+    """Table des noms : offsets (len + 1) dans un tableau d'octets UTF-8."""
+    encoded = [n.encode() for n in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return {'user_offsets': offsets, 'user_bytes': np.frombuffer(b"".join(encoded), dtype=np.uint8)}
+
+
+def export_snapshot(path: str, users: int, posts: int, follows: int,
+                    batch_size: int = BATCH_SIZE, rng_seed: int = None,
+                    graph: str = 'uniform', activity: str = 'uniform',
+                    exponent: float = ZIPF_EXPONENT):
+    """
+    Génère un dataset (mêmes tirages qu'un seed de même graine et même
+    --batch-size) et l'écrit dans un snapshot, sans accès à Datastore.
+    """
+    if rng_seed is None:
+        rng_seed = random.randrange(2 ** 32)
     base_time = datetime.utcnow()
-    batch = []
-    
-    for i in range(posts):
-        author = random.choice(user_names)
-        p = datastore.Entity(client.key('Post'))
-        p['author'] = author
-        p['content'] = f"Post {i+1} by {author}"
-        p['created'] = base_time - timedelta(seconds=i)
-        batch.append(p)
-        
-        # Écriture par batch de 500
-        if len(batch) >= 500:
-            client.put_multi(batch)
-            created_posts += len(batch)
-            print(f"  {created_posts}/{posts} posts créés...")
-            batch = []
-    
-    # Dernier batch
-    if batch:
+
+    print(f"Génération du graphe ({graph}, {follows} follows/user)...")
+    start = time.time()
+    targets = follow_graph(users, follows, graph, exponent, rng_seed)
+    report_phase("follows générés", targets.size, time.time() - start)
+
+    print(f"Génération de {posts} posts...")
+    start = time.time()
+    weights = author_weights(users, activity, exponent)
+    authors = [a for _, a in post_author_batches(users, posts, batch_size, rng_seed, 0, weights)]
+    post_author = np.concatenate(authors).astype(np.int32) if authors else np.zeros(0, np.int32)
+    base_us = (base_time - EPOCH) // timedelta(microseconds=1)
+    post_created = base_us - np.arange(posts, dtype=np.int64) * 1_000_000
+    report_phase("posts générés", posts, time.time() - start)
+
+    manifest = {'users': users, 'posts': posts, 'follows': follows,
+                'graph': graph, 'activity': activity, 'exponent': exponent,
+                **degree_summary(targets, users), 'rng_seed': rng_seed,
+                'base_time': base_time.isoformat(), 'post_ids': POST_IDS}
+    k = targets.shape[1]
+    write_snapshot(path, manifest, {
+        **intern_names([f"user{i}" for i in range(1, users + 1)]),
+        'follow_offsets': np.arange(users + 1, dtype=np.int64) * k,
+        'follow_index': targets.ravel().astype(np.int32),
+        'post_author': post_author,
+        'post_created': post_created,
+    })
+    print(f"✓ Snapshot écrit: {path} ({os.path.getsize(path) / 1e6:.1f} Mo)")
+
+
+def put_batches(client, batches, workers: int) -> int:
+    """
+    put_multi concurrents des batches produits à la demande (au plus
+    2*workers batches en mémoire), retourne le nb d'entités écrites.
+    """
+    def put(batch):
         client.put_multi(batch)
-        created_posts += len(batch)
-    
-    print(f"✓ Seed terminé: {created_users} users, {created_posts} posts")
+        return len(batch)
+
+    written = 0
+    inflight = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in batches:
+            if len(inflight) >= 2 * workers:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                written += sum(f.result() for f in done)
+            inflight.add(executor.submit(put, batch))
+        written += sum(f.result() for f in wait(inflight)[0])
+    return written
+
+
+def restore_snapshot(path: str, namespace: str = None, workers: int = NB_WORKERS,
+                     batch_size: int = BATCH_SIZE, storage=None):
+    """
+    Écrit dans Datastore le dataset d'un snapshot (users avec leurs follows,
+    puis posts) et son manifest. Les clés étant fixes, une restauration
+    interrompue se relance telle quelle ; elle est ignorée si le manifest
+    du namespace décrit déjà ce dataset.
+    """
+    manifest, arrays = read_snapshot(path)
+    manifest['post_ids'] = POST_IDS    # Ids recalculés à la restauration (anciens snapshots compris)
+    client = storage or make_storage(namespace=namespace)
+    if namespace:
+        print(f"Namespace: {namespace}")
+    identity = ('users', 'posts', 'follows', 'graph', 'activity', 'exponent', 'rng_seed',
+                'post_ids')
+    present = load_manifest(client)
+    if present is not None and all(present.get(k) == manifest[k] for k in identity):
+        print(f"✓ Dataset du snapshot déjà présent ({manifest['users']} users, "
+              f"{manifest['posts']} posts), restauration ignorée")
+        return
+
+    offsets, raw = arrays['user_offsets'], arrays['user_bytes']
+    names = [bytes(raw[offsets[i]:offsets[i + 1]]).decode() for i in range(len(offsets) - 1)]
+    follow_offsets, follow_index = arrays['follow_offsets'], arrays['follow_index']
+
+    def user_batches():
+        for indices in chunks(range(len(names)), batch_size):
+            batch = []
+            for i in indices:
+                entity = client.entity(client.key('User', names[i]))
+                entity['follows'] = sorted(
+                    names[j] for j in follow_index[follow_offsets[i]:follow_offsets[i + 1]])
+                batch.append(entity)
+            yield batch
+
+    def post_batches():
+        authors, created = arrays['post_author'], arrays['post_created']
+        for first in range(0, len(authors), batch_size):
+            yield [post_entity(client, i, names[a], EPOCH + timedelta(microseconds=int(t)))
+                   for i, a, t in zip(range(first, first + batch_size),
+                                      authors[first:first + batch_size].tolist(),
+                                      created[first:first + batch_size].tolist())]
+
+    print(f"Restauration de {path} ({workers} écritures en parallèle)...")
+    start = time.time()
+    report_phase("users écrits", put_batches(client, user_batches(), workers), time.time() - start)
+    start = time.time()
+    report_phase("posts écrits", put_batches(client, post_batches(), workers), time.time() - start)
+    save_manifest(client, {**manifest, 'base_time': datetime.fromisoformat(manifest['base_time']),
+                           'snapshot': os.path.basename(path)})
+    print(f"✓ Restauration terminée: {len(names)} users, {len(arrays['post_author'])} posts")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Seed Datastore local")
-    parser.add_argument('--users', type=int, required=True)
-    parser.add_argument('--posts', type=int, required=True)
-    parser.add_argument('--follows', type=int, required=True)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--posts', type=int)
+    parser.add_argument('--follows', type=int)
+    parser.add_argument('--workers', type=int, default=NB_WORKERS,
+                        help=f"Nb de threads d'écriture (default: {NB_WORKERS})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"Taille des batches get/put_multi (default: {BATCH_SIZE})")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprend un seed interrompu depuis le checkpoint")
+    parser.add_argument('--checkpoint',
+                        help=f"Fichier de checkpoint (default: {CHECKPOINT_FILE}, "
+                             "suffixé par le namespace)")
+    parser.add_argument('--seed', type=int, help="Graine du RNG (graphe et posts)")
+    parser.add_argument('--graph', choices=GRAPH_MODELS, default='uniform',
+                        help="Distribution du graphe de follows (default: uniform)")
+    parser.add_argument('--activity', choices=ACTIVITY_MODELS, default='uniform',
+                        help="Répartition des posts entre auteurs (default: uniform)")
+    parser.add_argument('--zipf', type=float, default=ZIPF_EXPONENT,
+                        help=f"Exposant des lois de Zipf (default: {ZIPF_EXPONENT})")
+    parser.add_argument('--extend', action='store_true',
+                        help="Complète le dataset décrit par le manifest au lieu de tout réécrire")
+    parser.add_argument('--namespace', help="Namespace Datastore du dataset (default: aucun)")
+    parser.add_argument('--export', metavar='SNAPSHOT',
+                        help="Écrit le dataset généré dans un snapshot au lieu de Datastore")
+    parser.add_argument('--restore', metavar='SNAPSHOT',
+                        help="Écrit dans Datastore le dataset d'un snapshot (--export)")
+    add_storage_arguments(parser)
     args = parser.parse_args()
-    
-    seed_data(args.users, args.posts, args.follows)
+
+    if not args.restore and None in (args.users, args.posts, args.follows):
+        parser.error("--users, --posts et --follows sont requis (sauf avec --restore)")
+    if args.export:
+        export_snapshot(args.export, args.users, args.posts, args.follows, args.batch_size,
+                        args.seed, args.graph, args.activity, args.zipf)
+        return
+
+    storage = make_storage(args.storage, args.namespace, args.rpc_latency, args.entity_latency)
+    if args.restore:
+        restore_snapshot(args.restore, args.namespace, args.workers, args.batch_size, storage)
+        return
+    seed_data(args.users, args.posts, args.follows, args.workers, args.batch_size,
+              args.resume, args.checkpoint, args.seed, args.extend, args.namespace,
+              args.graph, args.activity, args.zipf, storage)
 
 
 if __name__ == '__main__':
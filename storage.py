@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Backends de stockage de seed.py, clear_datastore.py, wait_ready.py et benchmark.py.
+
+Les méthodes reprennent celles de `datastore.Client` (key, get, get_multi,
+put, put_multi, delete, delete_multi) plus la création d'entités, le
+parcours keys-only d'un kind, le comptage, la requête de la timeline
+(posts d'un auteur par date décroissante) et celle des followers d'un user. Le backend est choisi par
+--storage (ou la variable d'environnement TINYINSTA_STORAGE) :
+
+- `datastore` : Cloud Datastore, projet résolu comme par l'app (main.py) :
+                DATASTORE_DATASET, puis GOOGLE_CLOUD_PROJECT, puis PROJECT ;
+- `emulator`  : émulateur Datastore local (DATASTORE_EMULATOR_HOST) ;
+- `memory`    : dictionnaire en mémoire, chaque RPC coûtant --rpc-latency ms
+                plus --entity-latency ms par entité (les RPC concurrents se
+                recouvrent, comme sur le réseau).
+
+Le backend memory ne vit que le temps du processus : il sert à mesurer et
+régler hors ligne le débit du seed et du nettoyage (taille des batches, nb
+de workers), ce que fait ce script.
+
+Usage (grille de réglage sur le backend memory):
+    python storage.py --users 1000 --posts 100000 --rpc-latency 30 --workers 4 8 16 32
+"""
+
+from collections import OrderedDict
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+try:
+    from google.cloud import datastore
+    from google.api_core.exceptions import GoogleAPICallError
+except ImportError:
+    datastore = None
+
+DEFAULT_STORAGE = os.environ.get('TINYINSTA_STORAGE', 'datastore')
+PROJECT = 'tinyinsta-480307'
+EMULATOR_HOST = 'localhost:8081'
+QUERY_PAGE = 1000      # Clés par page (un RPC) des requêtes keys-only du backend memory
+
+
+class DatastoreStorage:
+    """Cloud Datastore (ou l'émulateur si DATASTORE_EMULATOR_HOST est défini)."""
+
+    name = 'datastore'
+
+    def __init__(self, namespace: str = None, rpc_latency: float = 0.0,
+                 entity_latency: float = 0.0):
+        # Latences simulées ignorées : ce sont celles du réseau
+        if datastore is None:
+            raise RuntimeError("google-cloud-datastore non installé! "
+                               "Installez: pip install google-cloud-datastore")
+        # Même résolution du projet que main.py (DATASTORE_DATASET d'abord)
+        os.environ.setdefault('GOOGLE_CLOUD_PROJECT', PROJECT)
+        self.client = datastore.Client(namespace=namespace, **self.client_options())
+        self.namespace = namespace
+
+    def client_options(self) -> dict:
+        return {}
+
+    def key(self, kind: str, id_or_name):
+        return self.client.key(kind, id_or_name)
+
+    def entity(self, key, exclude_from_indexes: tuple = ()):
+        return datastore.Entity(key, exclude_from_indexes=exclude_from_indexes)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def get_multi(self, keys: list) -> list:
+        return self.client.get_multi(keys)
+
+    def put(self, entity):
+        self.client.put(entity)
+
+    def put_multi(self, entities: list):
+        self.client.put_multi(entities)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def delete_multi(self, keys: list):
+        self.client.delete_multi(keys)
+
+    def keys(self, kind: str):
+        """Toutes les clés d'un kind : une requête keys-only paginée par curseur."""
+        query = self.client.query(kind=kind)
+        query.keys_only()
+        for page in query.fetch().pages:
+            for entity in page:
+                yield entity.key
+
+    def count(self, kind: str) -> int:
+        """Compte les entités d'un kind sans matérialiser les clés."""
+        return count_entities(self.client, kind)
+
+    def author_posts(self, author: str, before=None, limit: int = 1) -> list:
+        """Requête de la timeline : posts de `author` au plus tard à `before`, récents d'abord."""
+        query = self.client.query(kind='Post')
+        query.add_filter('author', '=', author)
+        if before is not None:
+            query.add_filter('created', '<=', before)
+        query.order = ['-created']
+        return list(query.fetch(limit=limit))
+
+    def followers(self, user: str) -> list:
+        """Noms des users dont la liste `follows` contient `user` (requête keys-only de l'app)."""
+        query = self.client.query(kind='User')
+        query.add_filter('follows', '=', user)
+        query.keys_only()
+        return [e.key.name for e in query.fetch()]
+
+
+class EmulatorStorage(DatastoreStorage):
+    """Émulateur Datastore local (gcloud beta emulators datastore start)."""
+
+    name = 'emulator'
+
+    def client_options(self) -> dict:
+        from google.auth.credentials import AnonymousCredentials
+        os.environ.setdefault('DATASTORE_EMULATOR_HOST', EMULATOR_HOST)
+        return {'credentials': AnonymousCredentials()}
+
+
+class MemoryKey:
+    """Clé du backend memory (mêmes attributs que datastore.Key)."""
+
+    __slots__ = ('namespace', 'kind', 'id_or_name')
+
+    def __init__(self, namespace: str, kind: str, id_or_name):
+        self.namespace = namespace
+        self.kind = kind
+        self.id_or_name = id_or_name
+
+    @property
+    def name(self):
+        return self.id_or_name if isinstance(self.id_or_name, str) else None
+
+    @property
+    def id(self):
+        return self.id_or_name if isinstance(self.id_or_name, int) else None
+
+    def _tuple(self) -> tuple:
+        return (self.namespace, self.kind, self.id_or_name)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryKey) and self._tuple() == other._tuple()
+
+    def __hash__(self):
+        return hash(self._tuple())
+
+    def __repr__(self):
+        return f"MemoryKey{self._tuple()}"
+
+
+class MemoryEntity(dict):
+    """Entité du backend memory : un dict et sa clé."""
+
+    def __init__(self, key: MemoryKey = None, exclude_from_indexes: tuple = ()):
+        super().__init__()
+        self.key = key
+        self.exclude_from_indexes = set(exclude_from_indexes)
+
+
+class MemoryStorage:
+    """
+    Stockage en mémoire d'un namespace, à latence simulée : chaque appel
+    (get_multi, put_multi, page de requête...) dort `rpc_latency` ms hors du
+    verrou, plus `entity_latency` ms par entité.
+    """
+
+    name = 'memory'
+
+    def __init__(self, namespace: str = None, rpc_latency: float = 0.0,
+                 entity_latency: float = 0.0):
+        self.namespace = namespace
+        self.rpc_latency = rpc_latency
+        self.entity_latency = entity_latency
+        self.entities = OrderedDict()      # (kind, id_or_name) -> MemoryEntity
+        self.lock = threading.Lock()
+        self.rpcs = 0
+
+    def _rpc(self, size: int = 1):
+        with self.lock:
+            self.rpcs += 1
+        delay = self.rpc_latency + self.entity_latency * size
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _copy(self, entity):
+        if entity is None:
+            return None
+        copy = MemoryEntity(entity.key, entity.exclude_from_indexes)
+        copy.update(entity)
+        return copy
+
+    def key(self, kind: str, id_or_name) -> MemoryKey:
+        return MemoryKey(self.namespace, kind, id_or_name)
+
+    def entity(self, key: MemoryKey, exclude_from_indexes: tuple = ()) -> MemoryEntity:
+        return MemoryEntity(key, exclude_from_indexes)
+
+    def get(self, key: MemoryKey):
+        self._rpc()
+        with self.lock:
+            return self._copy(self.entities.get((key.kind, key.id_or_name)))
+
+    def get_multi(self, keys: list) -> list:
+        """Entités existantes parmi `keys` (les absentes sont omises, comme Datastore)."""
+        self._rpc(len(keys))
+        with self.lock:
+            found = (self.entities.get((k.kind, k.id_or_name)) for k in keys)
+            return [self._copy(e) for e in found if e is not None]
+
+    def put(self, entity: MemoryEntity):
+        self.put_multi([entity])
+
+    def put_multi(self, entities: list):
+        self._rpc(len(entities))
+        with self.lock:
+            for entity in entities:
+                self.entities[(entity.key.kind, entity.key.id_or_name)] = self._copy(entity)
+
+    def delete(self, key: MemoryKey):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys: list):
+        self._rpc(len(keys))
+        with self.lock:
+            for key in keys:
+                self.entities.pop((key.kind, key.id_or_name), None)
+
+    def keys(self, kind: str):
+        """Clés d'un kind, par pages de QUERY_PAGE (un RPC par page)."""
+        with self.lock:
+            keys = [self.key(k, i) for k, i in self.entities if k == kind]
+        for start in range(0, len(keys), QUERY_PAGE):
+            self._rpc()
+            yield from keys[start:start + QUERY_PAGE]
+
+    def count(self, kind: str) -> int:
+        self._rpc()
+        with self.lock:
+            return sum(1 for k, _ in self.entities if k == kind)
+
+    def author_posts(self, author: str, before=None, limit: int = 1) -> list:
+        self._rpc()
+        with self.lock:
+            posts = [e for (k, _), e in self.entities.items() if k == 'Post'
+                     and e.get('author') == author and (before is None or e['created'] <= before)]
+        posts.sort(key=lambda e: e['created'], reverse=True)
+        return [self._copy(e) for e in posts[:limit]]
+
+    def followers(self, user: str) -> list:
+        self._rpc()
+        with self.lock:
+            return [i for (k, i), e in self.entities.items()
+                    if k == 'User' and user in e.get('follows', ())]
+
+
+STORAGES = {s.name: s for s in (DatastoreStorage, EmulatorStorage, MemoryStorage)}
+
+
+def make_storage(backend: str = DEFAULT_STORAGE, namespace: str = None,
+                 rpc_latency: float = 0.0, entity_latency: float = 0.0):
+    """Instancie le backend `backend` ('datastore', 'emulator' ou 'memory') d'un namespace."""
+    if backend not in STORAGES:
+        raise ValueError(f"Backend de stockage inconnu: {backend} (choix: {', '.join(STORAGES)})")
+    return STORAGES[backend](namespace, rpc_latency, entity_latency)
+
+
+def add_storage_arguments(parser: argparse.ArgumentParser):
+    """Options du backend de stockage communes aux scripts (seed, nettoyage, attente, benchmark)."""
+    parser.add_argument('--storage', choices=list(STORAGES), default=DEFAULT_STORAGE,
+                        help=f"Backend de stockage (default: {DEFAULT_STORAGE}, cf. TINYINSTA_STORAGE)")
+    parser.add_argument('--rpc-latency', type=float, default=0.0,
+                        help="Latence simulée par RPC en ms (backend memory, default: 0)")
+    parser.add_argument('--entity-latency', type=float, default=0.0,
+                        help="Latence simulée par entité en ms (backend memory, default: 0)")
+
+
+def count_entities(client, kind: str) -> int:
+    """Compte les entités d'un kind Datastore sans matérialiser les clés."""
+    query = client.query(kind=kind)
+    try:
+        aggregation = client.aggregation_query(query).count(alias="total")
+        for results in aggregation.fetch():
+            for result in results:
+                if result.alias == "total":
+                    return result.value
+    except (AttributeError, GoogleAPICallError):
+        # Client trop ancien ou émulateur sans agrégation : comptage en streaming
+        pass
+    query.keys_only()
+    return sum(1 for _ in query.fetch())
+
+
+def main():
+    # Importés ici : seed.py et clear_datastore.py importent ce module
+    from seed import seed_data
+    from clear_datastore import delete_all_entities
+
+    parser = argparse.ArgumentParser(description="Débit du seed et du nettoyage sur le backend memory")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--follows', type=int, default=20)
+    parser.add_argument('--rpc-latency', type=float, default=30.0,
+                        help="Latence simulée par RPC en ms (default: 30)")
+    parser.add_argument('--entity-latency', type=float, default=0.05,
+                        help="Latence simulée par entité en ms (default: 0.05)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 8, 16, 32],
+                        help="Nb de workers testés")
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[100, 500],
+                        help="Tailles de batch testées")
+    args = parser.parse_args()
+
+    results = []
+    for batch_size in args.batch_size:
+        for workers in args.workers:
+            print(f"\n--- {workers} workers, batches de {batch_size} ---")
+            storage = MemoryStorage(None, args.rpc_latency, args.entity_latency)
+            checkpoint = os.path.join(tempfile.gettempdir(), f"tinyinsta_storage_{os.getpid()}.json")
+            start = time.time()
+            seed_data(args.users, args.posts, args.follows, workers, batch_size, rng_seed=0,
+                      checkpoint_path=checkpoint, storage=storage)
+            seed_time = time.time() - start
+            start = time.time()
+            deleted = sum(delete_all_entities(storage, kind, batch_size, workers=workers)
+                          for kind in ('User', 'Post'))
+            clear_time = time.time() - start
+            results.append((batch_size, workers, seed_time, clear_time, deleted))
+
+    print("\n" + "=" * 60)
+    print(f"{'BATCH':>6} {'WORKERS':>8} {'SEED (s)':>9} {'ENT./s':>9} {'CLEAR (s)':>10} {'ENT./s':>9}")
+    for batch_size, workers, seed_time, clear_time, deleted in results:
+        print(f"{batch_size:>6} {workers:>8} {seed_time:>9.1f} {deleted / seed_time:>9.0f} "
+              f"{clear_time:>10.1f} {deleted / clear_time:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP factice qui remplace l'app TinyInsta pour tester les moteurs
+de charge en local : /api/timeline (paginée par curseur), /api/post,
+/api/follow et /api/unfollow répondent après une latence simulée, avec un
+taux d'erreur configurable. Les posts publiés apparaissent en tête de la
+première page de toutes les timelines (mesure de visibilité du test write).
+/api/timeline renvoie un en-tête Server-Timing qui répartit la latence
+simulée entre les phases de l'app (cf. main.py).
+
+Usage:
+    python stub_server.py --port 8080
+    python stub_server.py --port 8080 --latency 50 --jitter 20 --error-rate 0.01
+    python benchmark.py --url http://localhost:8080 --test conc --engine async
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+from collections import deque
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+
+# Part de la latence simulée et nb de RPC de chaque phase de l'en-tête Server-Timing
+STUB_PHASES = {"follows": (0.1, 1), "queries": (0.75, 20), "merge": (0.05, 0), "serialize": (0.1, 0)}
+
+
+def server_timing(latency_ms: float) -> str:
+    """En-tête Server-Timing factice répartissant `latency_ms` entre STUB_PHASES."""
+    phases = [f'{name};dur={latency_ms * share:.2f}' + (f';desc="rpc={rpcs}"' if rpcs else "")
+              for name, (share, rpcs) in STUB_PHASES.items()]
+    return ", ".join([f"app;dur={latency_ms:.2f}"] + phases)
+
+
+def make_app(latency_ms: float = 20, jitter_ms: float = 10, error_rate: float = 0.0) -> web.Application:
+    """Construit l'app aiohttp factice."""
+    post_ids = itertools.count(1)
+    recent = deque(maxlen=20)
+
+    async def simulate():
+        """
+        Attend la latence simulée ; retourne une réponse 500 au taux d'erreur
+        choisi, sinon None et la latence attendue (ms).
+        """
+        delay = max(0.0, random.gauss(latency_ms, jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if random.random() < error_rate:
+            return web.json_response({"error": "stub error"}, status=500), delay
+        return None, delay
+
+    async def timeline(request: web.Request) -> web.Response:
+        error, delay = await simulate()
+        if error is not None:
+            return error
+        user = request.query.get("user", "user1")
+        limit = int(request.query.get("limit", 20))
+        offset = int(request.query.get("cursor", 0))
+        now = datetime.utcnow()
+        posts = [{"author": f"user{random.randint(1, 1000)}",
+                  "content": f"Post stub for {user}",
+                  "created": (now - timedelta(seconds=i)).isoformat()}
+                 for i in range(offset, offset + limit)]
+        if offset == 0:
+            posts = (list(reversed(recent)) + posts)[:limit]
+        return web.json_response({"user": user, "timeline": posts, "cursor": str(offset + limit)},
+                                 headers={"Server-Timing": server_timing(delay)})
+
+    async def write(request: web.Request) -> web.Response:
+        error, _ = await simulate()
+        if error is not None:
+            return error
+        return web.json_response({"status": "ok", **await request.json()})
+
+    async def post(request: web.Request) -> web.Response:
+        error, _ = await simulate()
+        if error is not None:
+            return error
+        data = await request.json()
+        entry = {"id": next(post_ids), "author": data.get("user"), "content": data.get("content", ""),
+                 "created": datetime.utcnow().isoformat()}
+        recent.append(entry)
+        return web.json_response({"id": entry["id"], "author": entry["author"]})
+
+    app = web.Application()
+    app.router.add_get("/api/timeline", timeline)
+    app.router.add_post("/api/post", post)
+    for path in ("/api/follow", "/api/unfollow"):
+        app.router.add_post(path, write)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur factice /api/timeline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=20, help="Latence moyenne (ms)")
+    parser.add_argument("--jitter", type=float, default=10, help="Écart-type de la latence (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 500")
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.latency, args.jitter, args.error_rate),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Stratégies de timeline de TinyInsta sur les entités écrites par seed.py
+(`User.follows`, `Post(author, content, created)`).
+
+- pull : fan-out à la lecture, une requête `author = X ORDER BY created DESC`
+         par followee, exécutées en parallèle (pool borné) et fusionnées
+         dans un tas au fil de leur arrivée ;
+- push : fan-out à l'écriture, chaque post est recopié dans une entité
+         `Timeline` par follower, la lecture est une seule requête.
+
+Les lectures renseignent un `ServerTiming` : durée et nb de RPC Datastore
+de chaque phase (followees, requêtes, fusion, sérialisation), renvoyés par
+main.py dans l'en-tête `Server-Timing`.
+
+Usage (remplissage des timelines matérialisées d'un dataset seedé):
+    python timeline.py --materialize --namespace fanout50
+"""
+
+from google.cloud import datastore
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import argparse
+import base64
+import heapq
+import itertools
+import json
+import threading
+import time
+import os
+os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'tinyinsta-480307')
+
+TIMELINE_KIND = 'Timeline'
+TIMELINE_DEPTH = 100   # Entrées matérialisées par user lors du remplissage (push)
+BATCH_SIZE = 500
+NB_WORKERS = 8
+QUERY_WORKERS = 16     # Requêtes par followee en vol, partagées par toutes les timelines
+
+# Pool partagé par les requêtes, borné quel que soit le fanout
+query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS)
+
+
+class ServerTiming:
+    """
+    Durées (ms) et nb de RPC Datastore des phases d'une requête, au format
+    de l'en-tête Server-Timing : `phase;dur=12.3;desc="rpc=1", ...`. Une
+    phase répétée (fusion depuis plusieurs threads) cumule ses durées.
+    """
+
+    def __init__(self):
+        self.phases = {}         # phase -> [durée ms, nb de RPC]
+        self.lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float, rpcs: int = 0):
+        with self.lock:
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += duration_ms
+            entry[1] += rpcs
+
+    @contextmanager
+    def phase(self, name: str, rpcs: int = 0):
+        """Chronomètre le bloc comme phase `name` (`rpcs` RPC Datastore)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000, rpcs)
+
+    def header(self) -> str:
+        return ", ".join(f'{name};dur={duration:.2f}' + (f';desc="rpc={rpcs}"' if rpcs else "")
+                         for name, (duration, rpcs) in self.phases.items())
+
+
+def post_to_dict(post: datastore.Entity) -> dict:
+    """Représentation JSON d'un post (ou d'une entrée de timeline)."""
+    return {
+        'id': post.get('post_id', post.key.id_or_name),
+        'author': post['author'],
+        'content': post.get('content', ''),
+        'created': post['created'].isoformat(),
+    }
+
+
+def get_follows(client: datastore.Client, user: str) -> list:
+    """Liste des followees d'un user (vide s'il n'existe pas)."""
+    entity = client.get(client.key('User', user))
+    return list(entity.get('follows', [])) if entity is not None else []
+
+
+def get_followers(client: datastore.Client, author: str) -> list:
+    """Users dont la liste `follows` contient `author`."""
+    query = client.query(kind='User')
+    query.add_filter('follows', '=', author)
+    query.keys_only()
+    return [e.key.name for e in query.fetch()]
+
+
+def encode_cursor(page: list, before: datetime = None, exclude: set = ()) -> str:
+    """
+    Curseur opaque de la page suivant `page` (posts au format de post_to_dict).
+
+    La fusion étant un ordre global par date, la frontière de tous les
+    followees se résume au dernier post servi : la page suivante contient
+    les posts de date <= cette frontière, moins les ids déjà servis à cette
+    date exacte (cumulés avec ceux du curseur précédent si la date est la même).
+    """
+    frontier = page[-1]['created']
+    ids = {p['id'] for p in page if p['created'] == frontier}
+    if before is not None and datetime.fromisoformat(frontier) == before:
+        ids |= set(exclude)
+    raw = json.dumps({'t': frontier, 'ids': sorted(ids, key=str)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(frontière, ids à exclure) d'un curseur ; ValueError s'il est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data['t']), set(data['ids'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"curseur invalide: {cursor}") from e
+
+
+def author_posts(client: datastore.Client, author: str, limit: int,
+                 after: datetime = None, before: datetime = None) -> list:
+    """
+    Les `limit` posts les plus récents d'un auteur, postérieurs à `after`
+    et au plus tard à `before` si donnés.
+    """
+    query = client.query(kind='Post')
+    query.add_filter('author', '=', author)
+    if after is not None:
+        query.add_filter('created', '>', after)
+    if before is not None:
+        query.add_filter('created', '<=', before)
+    query.order = ['-created']
+    return list(query.fetch(limit=limit))
+
+
+def newest_posts(client: datastore.Client, authors: list, limit: int,
+                 before: datetime = None, exclude: set = (), timing: ServerTiming = None) -> list:
+    """
+    Les `limit` posts les plus récents d'un ensemble d'auteurs, au plus tard
+    à `before` et hors des ids `exclude` (page suivante d'un curseur).
+
+    Les requêtes par auteur partent en parallèle dans `query_executor` et leurs
+    résultats sont fusionnés à l'arrivée dans un tas borné à `limit` entrées.
+    Dès que le tas est plein, son plus ancien post sert de plancher aux
+    requêtes pas encore lancées (`created > plancher`) : elles ne ramènent
+    que les posts qui peuvent encore entrer dans la timeline.
+
+    Dans `timing`, `queries` est la durée du fan-out (fusions comprises, elles
+    s'y intercalent) et `merge` le temps cumulé passé dans le tas puis le tri.
+    """
+    timing = timing or ServerTiming()
+    top = []                 # tas min de (created, seq, post)
+    seq = itertools.count()
+    lock = threading.Lock()
+
+    def fetch(author):
+        with lock:
+            floor = top[0][0] if len(top) >= limit else None
+        posts = author_posts(client, author, limit + len(exclude), after=floor, before=before)
+        with lock, timing.phase('merge'):
+            for post in posts:
+                if post.key.id_or_name in exclude:
+                    continue
+                item = (post['created'], next(seq), post)
+                if len(top) < limit:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+                else:
+                    break    # posts triés par date décroissante : la suite est plus ancienne
+
+    with timing.phase('queries', rpcs=len(authors)):
+        for future in [query_executor.submit(fetch, author) for author in authors]:
+            future.result()
+    with timing.phase('merge'):
+        return [post for _, _, post in sorted(top, reverse=True)]
+
+
+class PullTimeline:
+    """Fan-out à la lecture : requêtes parallèles par followee, fusion par tas."""
+
+    name = 'pull'
+
+    def __init__(self, client: datastore.Client):
+        self.client = client
+
+    def get(self, user: str, limit: int, before: datetime = None, exclude: set = (),
+            timing: ServerTiming = None) -> list:
+        timing = timing or ServerTiming()
+        with timing.phase('follows', rpcs=1):
+            follows = get_follows(self.client, user)
+        posts = newest_posts(self.client, follows, limit, before, exclude, timing)
+        with timing.phase('serialize'):
+            return [post_to_dict(p) for p in posts]
+
+    def on_post(self, post: datastore.Entity, followers: list):
+        pass
+
+    def on_follow(self, user: str, target: str):
+        pass
+
+    def on_unfollow(self, user: str, target: str):
+        pass
+
+
+class PushTimeline:
+    """Fan-out à l'écriture : une entité Timeline par (follower, post)."""
+
+    name = 'push'
+
+    def __init__(self, client: datastore.Client):
+        self.client = client
+
+    def entry(self, owner: str, post: datastore.Entity) -> datastore.Entity:
+        """Copie d'un post dans la timeline de `owner` (clé idempotente)."""
+        post_id = post.get('post_id', post.key.id_or_name)
+        entity = datastore.Entity(self.client.key(TIMELINE_KIND, f"{owner}/{post_id}"),
+                                  exclude_from_indexes=('content',))
+        entity.update({
+            'owner': owner,
+            'post_id': post_id,
+            'author': post['author'],
+            'content': post.get('content', ''),
+            'created': post['created'],
+        })
+        return entity
+
+    def get(self, user: str, limit: int, before: datetime = None, exclude: set = (),
+            timing: ServerTiming = None) -> list:
+        timing = timing or ServerTiming()
+        query = self.client.query(kind=TIMELINE_KIND)
+        query.add_filter('owner', '=', user)
+        if before is not None:
+            query.add_filter('created', '<=', before)
+        query.order = ['-created']
+        with timing.phase('queries', rpcs=1):
+            entries = [e for e in query.fetch(limit=limit + len(exclude))
+                       if e['post_id'] not in exclude]
+        with timing.phase('serialize'):
+            return [post_to_dict(e) for e in entries[:limit]]
+
+    def on_post(self, post: datastore.Entity, followers: list):
+        entries = [self.entry(owner, post) for owner in followers]
+        for i in range(0, len(entries), BATCH_SIZE):
+            self.client.put_multi(entries[i:i + BATCH_SIZE])
+
+    def on_follow(self, user: str, target: str):
+        posts = author_posts(self.client, target, TIMELINE_DEPTH)
+        if posts:
+            self.client.put_multi([self.entry(user, p) for p in posts])
+
+    def on_unfollow(self, user: str, target: str):
+        query = self.client.query(kind=TIMELINE_KIND)
+        query.add_filter('owner', '=', user)
+        query.add_filter('author', '=', target)
+        query.keys_only()
+        keys = [e.key for e in query.fetch()]
+        for i in range(0, len(keys), BATCH_SIZE):
+            self.client.delete_multi(keys[i:i + BATCH_SIZE])
+
+    def materialize(self, user: str, depth: int = TIMELINE_DEPTH) -> int:
+        """Remplit la timeline d'un user à partir des posts existants (dataset seedé)."""
+        posts = newest_posts(self.client, get_follows(self.client, user), depth)
+        entries = [self.entry(user, p) for p in posts]
+        if entries:
+            self.client.put_multi(entries)
+        return len(entries)
+
+
+STRATEGIES = {s.name: s for s in (PullTimeline, PushTimeline)}
+
+
+def make_strategy(name: str, client: datastore.Client):
+    """Instancie la stratégie de timeline `name` ('pull' ou 'push')."""
+    if name not in STRATEGIES:
+        raise ValueError(f"Stratégie de timeline inconnue: {name} (choix: {', '.join(STRATEGIES)})")
+    return STRATEGIES[name](client)
+
+
+def materialize_all(namespace: str = None, depth: int = TIMELINE_DEPTH,
+                    workers: int = NB_WORKERS) -> int:
+    """Remplit les timelines matérialisées de tous les users d'un namespace."""
+    client = datastore.Client(namespace=namespace)
+    push = PushTimeline(client)
+    query = client.query(kind='User')
+    query.keys_only()
+    users = [e.key.name for e in query.fetch()]
+
+    print(f"Remplissage des timelines de {len(users)} users ({depth} entrées max)...")
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        total = sum(executor.map(lambda u: push.materialize(u, depth), users))
+    elapsed = time.time() - start
+    print(f"  -> {total} entrées écrites en {elapsed:.1f}s")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timelines matérialisées (stratégie push)")
+    parser.add_argument('--materialize', action='store_true', required=True,
+                        help="Remplit les timelines à partir des posts existants")
+    parser.add_argument('--namespace', help="Namespace Datastore du dataset (default: aucun)")
+    parser.add_argument('--depth', type=int, default=TIMELINE_DEPTH,
+                        help=f"Entrées par timeline (default: {TIMELINE_DEPTH})")
+    parser.add_argument('--workers', type=int, default=NB_WORKERS,
+                        help=f"Nb de users traités en parallèle (default: {NB_WORKERS})")
+    args = parser.parse_args()
+
+    materialize_all(args.namespace, args.depth, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Série temporelle par seconde d'un run de benchmark.
+
+Chaque seconde écoulée depuis le début du run cumule ses requêtes (donc le
+débit), ses échecs, le nb de users (ou de requêtes en vol en boucle ouverte)
+et un histogramme de ses latences, d'où ses percentiles. Le format binaire
+est colonnaire et ne garde que les résumés (p50/p90/p99/max en float32) :
+quelques Ko pour un run de plusieurs minutes.
+
+Usage:
+    python timeseries.py out/fanout50/series/fanout_50_run1.tis
+"""
+
+from array import array
+import argparse
+import struct
+import time
+
+from histogram import LatencyHistogram
+
+PERCENTILES = [50, 90, 99]
+MAGIC = b"TIS1"
+HEADER = struct.Struct("<4sdIi")     # magic, début (epoch s), nb secondes, fin de l'échauffement (-1 : aucun)
+
+# Colonnes du format binaire -> type de l'array
+COLUMNS = {"requests": "I", "errors": "I", "inflight": "I",
+           **{f"p{p}": "f" for p in PERCENTILES}, "max": "f"}
+
+
+class TimeSeries:
+    """Compteurs et histogramme de latences de chaque seconde d'un run."""
+
+    def __init__(self):
+        self.start(time.time(), time.perf_counter())
+        self.warmup = None       # Seconde de début de la mesure (requêtes d'avant écartées)
+
+    def start(self, epoch: float, origin: float):
+        """(Re)démarre la série : `epoch` horodate la seconde 0, `origin` est son perf_counter."""
+        self.epoch = epoch
+        self.origin = origin
+        self.seconds = {}        # seconde -> [requêtes, échecs, en vol, histogramme]
+
+    def _bucket(self) -> list:
+        second = int(time.perf_counter() - self.origin)
+        if second not in self.seconds:
+            self.seconds[second] = [0, 0, 0, LatencyHistogram()]
+        return self.seconds[second]
+
+    def record(self, latency_ms: float, error: bool = False):
+        """Ajoute une requête à la seconde courante."""
+        bucket = self._bucket()
+        bucket[0] += 1
+        bucket[1] += bool(error)
+        bucket[3].record(latency_ms)
+
+    def record_hist(self, hist: LatencyHistogram, errors: int = 0):
+        """Ajoute à la seconde courante des requêtes déjà agrégées (rapport d'un worker)."""
+        bucket = self._bucket()
+        bucket[0] += hist.total
+        bucket[1] += errors
+        bucket[3].merge(hist)
+
+    def set_inflight(self, count: int):
+        """Relève le nb de users (ou de requêtes) en vol à la seconde courante."""
+        bucket = self._bucket()
+        bucket[2] = max(bucket[2], count)
+
+    def columns(self) -> dict:
+        """Colonnes de COLUMNS, une valeur par seconde de 0 à la dernière seconde vue."""
+        length = max(self.seconds, default=-1) + 1
+        columns = {name: [0] * length for name in COLUMNS}
+        for second, (requests, errors, inflight, hist) in self.seconds.items():
+            columns["requests"][second] = requests
+            columns["errors"][second] = errors
+            columns["inflight"][second] = inflight
+            for p in PERCENTILES:
+                columns[f"p{p}"][second] = hist.percentile(p)
+            columns["max"][second] = hist.percentile(100)
+        return columns
+
+    def to_bytes(self) -> bytes:
+        columns = self.columns()
+        length = len(columns["requests"])
+        warmup = -1 if self.warmup is None else self.warmup
+        return HEADER.pack(MAGIC, self.epoch, length, warmup) + b"".join(
+            array(typecode, columns[name]).tobytes() for name, typecode in COLUMNS.items())
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+
+class SeriesData:
+    """Série relue depuis le format binaire : colonnes par seconde et métadonnées."""
+
+    def __init__(self, epoch: float, warmup: int, columns: dict):
+        self.epoch = epoch
+        self.warmup = warmup
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["requests"])
+
+    @classmethod
+    def from_bytes(cls, data: bytes, source: str = "données") -> "SeriesData":
+        magic, epoch, length, warmup = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{source}: pas une série temporelle")
+        columns = {}
+        offset = HEADER.size
+        for name, typecode in COLUMNS.items():
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(data[offset:offset + size])
+            columns[name] = values.tolist()
+            offset += size
+        return cls(epoch, None if warmup < 0 else warmup, columns)
+
+    @classmethod
+    def load(cls, path: str) -> "SeriesData":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read(), path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Affiche la série par seconde d'un run")
+    parser.add_argument("file", help="Fichier .tis")
+    args = parser.parse_args()
+
+    series = SeriesData.load(args.file)
+    start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(series.epoch))
+    warmup = f", échauffement jusqu'à {series.warmup}s" if series.warmup is not None else ""
+    print(f"Début {start}, {len(series)}s{warmup}")
+    print(f"{'t':>4} {'req/s':>6} {'échecs':>6} {'en vol':>6} "
+          + " ".join(f"{'p' + str(p):>8}" for p in PERCENTILES) + f" {'max':>8}")
+    for t in range(len(series)):
+        c = series.columns
+        print(f"{t:>4} {c['requests'][t]:>6} {c['errors'][t]:>6} {c['inflight'][t]:>6} "
+              + " ".join(f"{c[f'p{p}'][t]:>8.1f}" for p in PERCENTILES) + f" {c['max'][t]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
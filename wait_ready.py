@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Attend que le dataset seedé soit visible par les requêtes de /api/timeline.
+
+Remplace le `sleep` fixe après chaque seed : interroge les mêmes requêtes que
+la timeline (Post filtré par author, trié par created décroissant) et les
+comptages globaux jusqu'à retrouver ce que décrit le manifest du seed.
+
+Usage:
+    python wait_ready.py                          # Namespace par défaut
+    python wait_ready.py --namespace fanout50     # Dataset d'un namespace
+    python wait_ready.py --timeout 120 --interval 1
+    python wait_ready.py --storage emulator       # Émulateur local (cf. storage.py)
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from seed import load_manifest, post_key_id
+from storage import DEFAULT_STORAGE, add_storage_arguments, make_storage
+
+TIMEOUT = 300
+POLL_INTERVAL = 2
+NB_SAMPLES = 5
+
+
+def sample_post_ids(posts: int, samples: int) -> list:
+    """Ids du premier et du dernier post écrits, plus de quelques posts tirés au hasard."""
+    indices = {0, posts - 1}
+    indices.update(random.randrange(posts) for _ in range(samples))
+    return [post_key_id(i) for i in sorted(indices)]
+
+
+def timeline_visible(storage, post_id: int) -> bool:
+    """
+    Vrai si le post est retourné par la requête de la timeline
+    (author = X ORDER BY created DESC), donc si l'index composite est à jour.
+    """
+    post = storage.get(storage.key('Post', post_id))
+    if post is None:
+        return False
+    return any(e.key.id == post_id
+               for e in storage.author_posts(post['author'], post['created'], limit=1))
+
+
+def check_ready(storage, manifest: dict, post_ids: list) -> list:
+    """Retourne la liste des vérifications encore en échec (vide = prêt)."""
+    pending = []
+    users = storage.count('User')
+    if users < manifest['users']:
+        pending.append(f"users {users}/{manifest['users']}")
+    posts = storage.count('Post')
+    if posts < manifest['posts']:
+        pending.append(f"posts {posts}/{manifest['posts']}")
+    missing = [i for i in post_ids if not timeline_visible(storage, i)]
+    if missing:
+        pending.append(f"timeline {len(post_ids) - len(missing)}/{len(post_ids)} posts indexés")
+    return pending
+
+
+def wait_ready(namespace: str = None, timeout: float = TIMEOUT,
+               interval: float = POLL_INTERVAL, samples: int = NB_SAMPLES,
+               storage=None) -> float:
+    """
+    Attend la convergence du dataset décrit par le manifest, lu dans le
+    backend `storage` (par défaut celui de TINYINSTA_STORAGE).
+    Retourne le temps de convergence observé (s), ou -1 si `timeout` est atteint.
+    """
+    storage = storage or make_storage(DEFAULT_STORAGE, namespace)
+    start = time.time()
+
+    manifest = load_manifest(storage)
+    while manifest is None and time.time() - start < timeout:
+        time.sleep(interval)
+        manifest = load_manifest(storage)
+    if manifest is None:
+        print("❌ Aucun manifest trouvé, lancer seed.py d'abord")
+        return -1
+
+    post_ids = sample_post_ids(manifest['posts'], samples) if manifest['posts'] else []
+    print(f"Attente du dataset ({manifest['users']} users, {manifest['posts']} posts, "
+          f"{len(post_ids)} posts témoins)...")
+
+    while True:
+        pending = check_ready(storage, manifest, post_ids)
+        elapsed = time.time() - start
+        if not pending:
+            print(f"  -> Dataset prêt en {elapsed:.1f}s")
+            return elapsed
+        if elapsed >= timeout:
+            print(f"❌ Timeout après {elapsed:.0f}s: {', '.join(pending)}")
+            return -1
+        print(f"  {elapsed:.0f}s: {', '.join(pending)}")
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attend la convergence du dataset seedé")
+    parser.add_argument('--namespace', help="Namespace Datastore du dataset (default: aucun)")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help=f"Attente maximale en secondes (default: {TIMEOUT})")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help=f"Intervalle entre deux vérifications (default: {POLL_INTERVAL}s)")
+    parser.add_argument('--samples', type=int, default=NB_SAMPLES,
+                        help=f"Nb de posts témoins tirés au hasard (default: {NB_SAMPLES})")
+    add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    storage = make_storage(args.storage, args.namespace, args.rpc_latency, args.entity_latency)
+    elapsed = wait_ready(args.namespace, args.timeout, args.interval, args.samples, storage)
+    sys.exit(0 if elapsed >= 0 else 1)
+
+
+if __name__ == '__main__':
+    main()